@@ -1,5 +1,9 @@
 from sdict.alpha import AlphaSortedDict
 from sdict.base import SortedDict
+from sdict.frozen import FrozenAlphaSortedDict, FrozenSortedDict
+from sdict.shared import SharedSortedDict
+from sdict.sharded import ShardedSortedDict
+from sdict.windowed import WindowedSortedDict
 import os
 import re
 
@@ -15,3 +19,5 @@ with open('%s/VERSION' % _dirname) as version_file:
 # Include short names for each provided class.
 sdict = SortedDict
 adict = AlphaSortedDict
+fsdict = FrozenSortedDict
+fadict = FrozenAlphaSortedDict
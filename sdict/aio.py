@@ -0,0 +1,116 @@
+"""Cooperative iteration and bulk loading of sorted dictionaries, for use
+from asyncio code.
+
+Each of these hands control back to the event loop every `chunk_size`
+keys, so that working through a very large dictionary does not stall
+everything else. They otherwise behave like their synchronous
+counterparts: iteration is over a snapshot of the key order taken when it
+begins, and items and values are looked up as they are reached.
+
+This module requires Python 3.7 or later, and is not imported by
+`sdict` itself.
+"""
+from sdict.collation import Collation
+from sdict.utils import iter_pairs
+from timeit import default_timer
+import asyncio
+import functools
+import operator
+
+
+async def aiter_items(d, chunk_size=1000, executor=None):
+    """Asynchronously iterate over the items of the given sorted
+    dictionary, in order.
+    """
+    async for key in aiter_keys(d, chunk_size=chunk_size, executor=executor):
+        yield (key, d[key])
+
+
+async def aiter_keys(d, chunk_size=1000, executor=None):
+    """Asynchronously iterate over the keys of the given sorted
+    dictionary, in order.
+
+    If the key order must be worked out first and `executor` is given,
+    the sort is run in that executor (see `key_order`).
+    """
+    order = await key_order(d, executor=executor)
+    for i, key in enumerate(order, 1):
+        yield key
+        if i % chunk_size == 0:
+            await asyncio.sleep(0)
+
+
+async def aiter_values(d, chunk_size=1000, executor=None):
+    """Asynchronously iterate over the values of the given sorted
+    dictionary, in key order.
+    """
+    async for key in aiter_keys(d, chunk_size=chunk_size, executor=executor):
+        yield d[key]
+
+
+async def key_order(d, executor=None):
+    """Return a copy of the key order of the given sorted dictionary.
+
+    If the order is not cached and `executor` is given, sort the keys in
+    that executor rather than blocking the event loop. The order is
+    cached as usual, unless the keys change while the sort is running.
+    """
+    if d._key_order_cache or executor is None:
+        return list(d._key_order())
+
+    # Take a snapshot of the keys, and sort it elsewhere.
+    version = d._key_set_version
+    keys = list(dict.keys(d))
+    sort_key = d._sort_key_function()
+    loop = asyncio.get_running_loop()
+    start = default_timer()
+    if sort_key is d._cmp and not isinstance(d._cmp, Collation):
+        order = await loop.run_in_executor(
+            executor,
+            functools.partial(sorted, keys, key=d._cmp),
+        )
+    else:
+        # The sort keys are cached (or interned), and the cache may change
+        # under us while the sort runs; look them up here, so that the
+        # executor only has to compare them.
+        pairs = [(sort_key(key), key) for key in keys]
+        pairs = await loop.run_in_executor(
+            executor,
+            functools.partial(sorted, pairs, key=operator.itemgetter(0)),
+        )
+        order = [key for value, key in pairs]
+    if d._stats is not None:
+        d._stats.record_sort(len(keys), start,
+                             cached=sort_key is not d._cmp)
+
+    # Cache the order, unless the keys changed while we were sorting.
+    if d._key_set_version == version and not d._key_order_cache:
+        d._key_order_cache = list(order)
+    return order
+
+
+async def load(d, data, chunk_size=1000, executor=None):
+    """Add keys and values from a dictionary or an iterable of two-tuples
+    to the given sorted dictionary, then work out its key order.
+
+    The key order is sorted in `executor`, if given (see `key_order`).
+    Return the dictionary.
+    """
+    await update(d, data, chunk_size=chunk_size)
+    await key_order(d, executor=executor)
+    return d
+
+
+async def update(d, other, chunk_size=1000):
+    """Add keys and values from a dictionary or an iterable of two-tuples
+    to the given sorted dictionary, `chunk_size` at a time.
+    """
+    chunk = []
+    for pair in iter_pairs(other):
+        chunk.append(pair)
+        if len(chunk) == chunk_size:
+            d.update(chunk)
+            chunk = []
+            await asyncio.sleep(0)
+    if chunk:
+        d.update(chunk)
@@ -1,4 +1,6 @@
-from sdict.base import SortedDict
+from sdict.base import NoDefault, SortedDict
+from sdict.collation import Collation, get_collation
+from sdict.utils import iter_pairs
 import six
 
 
@@ -6,32 +8,129 @@ class AlphaSortedDict(SortedDict):
     """A dictionary subclass where keys are always sorted in
     alphabetical order (case-insensitive).
     """
-    def __init__(self, __data=None, **kwargs):
-        # Coerce all keys in the __data dict to strings.
-        data_dict = {}
-        if __data:
-            for key, value in six.iteritems(dict(__data)):
-                data_dict[six.text_type(key)] = value
+    # When the collation is an expensive one, the collation key of every
+    # key in the dictionary, computed once on insertion. (This is a class
+    # attribute so that it exists while unpickling.)
+    _sort_key_cache = None
+
+    def __init__(self, __data=None, __collation='lower', **kwargs):
+        """Create a new alphabetically sorted dictionary.
+
+        The first positional argument, if provided, is initial keys and
+        values to compose the dictionary. Arbitrary keyword arguments are
+        also accepted.
+
+        The second positional argument, if provided, is the collation
+        used to put keys in alphabetical order: "lower" (the default),
+        "casefold", "natural", or "locale", or any function which takes
+        a text key and returns a value used for ordering.
+        """
+        cmp = get_collation(__collation)
+        if isinstance(cmp, Collation):
+            self._sort_key_cache = {}
 
         # The superclass' construction otherwise works fine
         # for this case.
-        return super(AlphaSortedDict, self).__init__(six.text_type.lower,
-                                                     data_dict,
-                                                     **kwargs)
+        super(AlphaSortedDict, self).__init__(cmp)
+
+        # Add the initial data, coercing keys as we go.
+        if __data:
+            self._load(__data)
+
+        # If keyword arguments were sent, add them.
+        for k, v in six.iteritems(kwargs):
+            self[k] = v
+
+    def __delitem__(self, key):
+        super(AlphaSortedDict, self).__delitem__(key)
+        if self._sort_key_cache is not None:
+            del self._sort_key_cache[key]
+
+    def freeze(self):
+        """Return an immutable, hashable copy of this dictionary
+        (a FrozenAlphaSortedDict), with the same keys, values, and order.
+        """
+        from sdict.frozen import FrozenAlphaSortedDict
+        return FrozenAlphaSortedDict._from_sorted_dict(self, self._key_order())
 
     def __setitem__(self, key, value):
         key = six.text_type(key)
+        if self._sort_key_cache is not None:
+            self._cache_sort_key(key)
         return super(AlphaSortedDict, self).__setitem__(key, value)
 
+    def clear(self):
+        super(AlphaSortedDict, self).clear()
+        if self._sort_key_cache is not None:
+            self._sort_key_cache.clear()
+
+    def pop(self, key, default=NoDefault()):
+        answer = super(AlphaSortedDict, self).pop(key, default)
+        if self._sort_key_cache is not None:
+            self._sort_key_cache.pop(key, None)
+        return answer
+
     def setdefault(self, key, default):
         key = six.text_type(key)
+        if self._sort_key_cache is not None:
+            self._cache_sort_key(key)
         return super(AlphaSortedDict, self).setdefault(key, default)
 
     def update(self, other):
-        # Coerce every key on the `other` dictionary to unicode.
-        coerced_other = {}
-        for key, value in six.iteritems(dict(other)):
-            coerced_other[six.text_type(key)] = value
+        self._load(other)
+
+    def _blank(self):
+        return self.__class__(None, self._cmp)
+
+    def _cache_sort_key(self, key):
+        """Record the collation key of the given key, unless it is
+        already known.
+        """
+        if key not in self._sort_key_cache:
+            self._sort_key_cache[key] = self._cmp(key)
+
+    def _load(self, data):
+        """Add the keys and values from a dictionary or an iterable of
+        two-tuples, coercing keys to text (and working out their
+        collation keys, if they are kept) in the same pass.
+
+        Nothing is copied up front, so an iterable of pairs is consumed
+        as a stream.
+        """
+        text_type = six.text_type
+        cache = self._sort_key_cache
+
+        # If this is a dictionary whose keys are all text already (and
+        # that includes any AlphaSortedDict), there is nothing to coerce,
+        # and it can be merged in wholesale.
+        if isinstance(data, dict) and all(
+                type(key) is text_type for key in dict.__iter__(data)):
+            if cache is not None:
+                if (isinstance(data, AlphaSortedDict) and
+                        data._cmp == self._cmp):
+                    cache.update(data._sort_key_cache)
+                else:
+                    for key in dict.__iter__(data):
+                        self._cache_sort_key(key)
+            if isinstance(data, SortedDict):
+                # Do not let the merge sort the other dictionary's keys.
+                data = iter_pairs(data)
+            dict.update(self, data)
+            self._clear_key_order_cache()
+            return
+
+        # Otherwise, coerce any keys which are not already text, and add
+        # them one at a time.
+        setitem = dict.__setitem__
+        for key, value in iter_pairs(data):
+            if type(key) is not text_type:
+                key = text_type(key)
+            if cache is not None and key not in cache:
+                cache[key] = self._cmp(key)
+            setitem(self, key, value)
+        self._clear_key_order_cache()
 
-        # Run the superclass `update` function.
-        return super(AlphaSortedDict, self).update(coerced_other)
+    def _sort_key_function(self):
+        if self._sort_key_cache is not None:
+            return self._sort_key_cache.__getitem__
+        return self._cmp
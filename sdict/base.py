@@ -1,5 +1,9 @@
 from copy import copy, deepcopy
-from sdict.utils import smart_repr
+from sdict.stats import SortStats
+from sdict.utils import bisect_left, replay, smart_repr
+from timeit import default_timer
+import heapq
+import itertools
 import six
 
 
@@ -12,6 +16,21 @@ class SortedDict(dict):
     """A dict subclass that always returns keys in alphabetical order,
     and iterates over keys in alphabetical order."""
 
+    # Dictionaries with fewer keys than this are always sorted in full
+    # when the key order is needed, rather than lazily; for larger ones,
+    # this many keys are selected before falling back to a full sort.
+    _lazy_order_min_size = 1024
+    _lazy_order_batch = 64
+
+    # Unpickling adds the items before restoring instance attributes,
+    # so the counter needs a class-level default.
+    _key_set_version = 0
+
+    # Statistics about sorting are off unless asked for, either for
+    # a single instance or for a whole class (see `enable_stats` and
+    # `enable_class_stats`).
+    _stats = None
+
     def __init__(self, __cmp, __data=None, **kwargs):
         """Create a new sorted dictionary.
 
@@ -29,16 +48,20 @@ class SortedDict(dict):
         values to compose the dictionary. Arbitrary keyword arguments are
         also accepted.
         """
-        # Initialize a key order list.
+        # Initialize a key order list, and a counter which changes
+        # whenever the set of keys does.
         self._key_order_cache = []
+        self._key_set_version = 0
 
         # Save the comparison function being used.
         self._cmp = __cmp
 
         # Create a dictionary based on the positional argument
-        # (including, possibly, an empty one).
+        # (including, possibly, an empty one). The built-in constructor
+        # accepts a dictionary or an iterable of pairs, so there is no
+        # need to copy it first.
         __data = __data or []
-        super(SortedDict, self).__init__(dict(__data))
+        super(SortedDict, self).__init__(__data)
 
         # If keyword arguments were sent, add them.
         for k, v in six.iteritems(kwargs):
@@ -48,28 +71,18 @@ class SortedDict(dict):
     def __copy__(self):
         """Create and return a shallow copy of this instance."""
 
-        # Attempt to figure out from the method signature whether
-        # a comparison function is expected.
-        args = [self]
-        code = six.get_function_code(self.__class__.__init__)
-        if any([i.endswith('__cmp') for i in code.co_varnames]):
-            args.insert(0, self._cmp)
+        # Create an empty sorted dictionary, and fill it.
+        answer = self._blank()
+        answer.update(self)
 
-        # Create the shallow copy.
-        return self.__class__(*args)
+        # Done.
+        return answer
 
     def __deepcopy__(self, memo=None):
         """Create and return a deep copy of this instance."""
 
-        # Attempt to figure out from the method signature whether
-        # a comparison function is expected.
-        args = []
-        code = six.get_function_code(self.__class__.__init__)
-        if any([i.endswith('__cmp') for i in code.co_varnames]):
-            args.append(self._cmp)
-
         # Create an empty sorted dictionary.
-        answer = self.__class__(*args)
+        answer = self._blank()
 
         # Ensure that this object is in our memo list, in case
         # there is a recursive relationship.
@@ -87,9 +100,36 @@ class SortedDict(dict):
         # Done.
         return answer
 
+    def __ge__(self, other):
+        answer = self._ordered_compare(other)
+        if answer is NotImplemented:
+            return answer
+        return answer >= 0
+
+    def __gt__(self, other):
+        answer = self._ordered_compare(other)
+        if answer is NotImplemented:
+            return answer
+        return answer > 0
+
     def __iter__(self):
         return six.iterkeys(self)
 
+    def __le__(self, other):
+        answer = self._ordered_compare(other)
+        if answer is NotImplemented:
+            return answer
+        return answer <= 0
+
+    def __lt__(self, other):
+        answer = self._ordered_compare(other)
+        if answer is NotImplemented:
+            return answer
+        return answer < 0
+
+    def __reversed__(self):
+        return self.reversed_keys()
+
     def __repr__(self, object_list=None):
         """Send down a useful, unambiguous representation of the
         object.
@@ -124,8 +164,7 @@ class SortedDict(dict):
     def __delitem__(self, key):
         # The key should be in the key order cache; remove it.
         # We can safely do this without breaking order.
-        if key in self._key_order_cache:
-            self._key_order_cache.remove(key)
+        self._discard_from_key_order_cache(key)
 
         # Remove the item from the dictionary.
         super(SortedDict, self).__delitem__(key)
@@ -134,38 +173,318 @@ class SortedDict(dict):
         super(SortedDict, self).clear()
         self._clear_key_order_cache()
 
+    def _blank(self):
+        """Return a new, empty instance of this class, ordered in the
+        same way as this one.
+        """
+        # Attempt to figure out from the method signature whether
+        # a comparison function is expected.
+        args = []
+        code = six.get_function_code(self.__class__.__init__)
+        if any([i.endswith('__cmp') for i in code.co_varnames]):
+            args.append(self._cmp)
+        return self.__class__(*args)
+
     def _clear_key_order_cache(self):
         self._key_order_cache = []
+        self._key_set_version += 1
+        if self._stats is not None:
+            self._stats.record('invalidations')
+
+    def _discard_from_key_order_cache(self, key):
+        """Remove the given key from the key order cache, if it is there.
+        The rest of the cache remains in order.
+
+        Nothing happens if the key is not in the dictionary at all.
+        """
+        if not super(SortedDict, self).__contains__(key):
+            return
+        self._key_set_version += 1
+        if self._stats is not None and self._key_order_cache:
+            self._stats.record('removals')
+        try:
+            self._key_order_cache.remove(key)
+        except ValueError:
+            pass
+
+    def disable_stats(self):
+        """Stop recording statistics for this instance. If statistics
+        are being recorded for its class, they carry on.
+        """
+        self.__dict__.pop('_stats', None)
+
+    @classmethod
+    def disable_class_stats(cls):
+        """Stop recording statistics for this class. If statistics are
+        being recorded for a parent class, they carry on.
+        """
+        if cls is SortedDict:
+            cls._stats = None
+        elif '_stats' in cls.__dict__:
+            del cls._stats
+
+    def enable_stats(self, hook=None):
+        """Start recording statistics about the sorting work this
+        instance does, and return the SortStats object they are
+        recorded in.
+
+        If a hook is provided, it is called as `hook(name, amount)` every
+        time a counter changes.
+        """
+        self._stats = SortStats(hook=hook)
+        return self._stats
+
+    @classmethod
+    def enable_class_stats(cls, hook=None):
+        """Start recording statistics about the sorting work done by
+        every instance of this class (and its subclasses), aggregated
+        together, and return the SortStats object they are recorded in.
+
+        Instances with statistics of their own enabled record there
+        instead.
+        """
+        cls._stats = SortStats(hook=hook)
+        return cls._stats
+
+    def freeze(self):
+        """Return an immutable, hashable copy of this dictionary
+        (a FrozenSortedDict), with the same keys, values, and order.
+
+        If the key order has already been generated, it is reused
+        rather than sorting again.
+        """
+        from sdict.frozen import FrozenSortedDict
+        return FrozenSortedDict._from_sorted_dict(self, self._key_order())
 
     def index(self, key):
         """Return the index of the given key. If the key is not
         present in the dictionary, raise IndexError.
         """
-        # Sanity check: Has the key order cache been generated?
-        # If not, generate it.
-        if not self._key_order_cache:
-            [k for k in self.keys()]
-
-        # Return the index of this key within the list.
-        return self._key_order_cache.index(key)
+        if key not in self:
+            raise ValueError('%r is not in the dictionary.' % (key,))
+
+        # Binary search the key order cache for the first key which
+        # compares equal to this one, then step forward to the key itself.
+        order = self._key_order()
+        cmp, sort_key = self._counted_sort_functions()
+        i = bisect_left(order, sort_key(key), sort_key)
+        while order[i] != key:
+            i += 1
+        return i
+
+    def irange(self, start=None, stop=None, descending=False):
+        """Iterate over the keys from `start` (inclusive) up to `stop`
+        (exclusive), in order.
+
+        The bounds are passed through the comparison function and need
+        not be present in the dictionary themselves. Either bound may be
+        omitted (or None) to leave that end of the range open.
+
+        If `descending` is True, iterate over the same keys from last to
+        first; see `reversed_keys`.
+        """
+        order = self._key_order()
+        cmp, sort_key = self._counted_sort_functions()
+
+        # Find the edges of the range within the key order cache.
+        # The order is sorted, so a binary search will do.
+        lo, hi = 0, len(order)
+        if start is not None:
+            lo = bisect_left(order, cmp(start), sort_key)
+        if stop is not None:
+            hi = bisect_left(order, cmp(stop), sort_key, lo=lo)
+
+        # Iterate backwards over the slice in place...
+        if descending:
+            for key in self._walk_backwards(order, lo, hi):
+                yield key
+            return
+
+        # ...or forwards over a copy of that slice, yielding each key.
+        for key in order[lo:hi]:
+            yield key
 
     def items(self):
         for key in self.keys():
             yield (key, self[key])
 
     def keys(self):
-        """Return the keys for this dictionary, ordered."""
+        """Return the keys for this dictionary, ordered.
+
+        If the key order has not been generated yet, the keys are
+        produced incrementally, so a loop which stops after the first
+        few keys does not pay for a full sort. The order is cached once
+        iteration runs to the end.
+        """
+        # If there is already a cache of the ordered keys (or the
+        # dictionary is small enough that a full sort is cheap), iterate
+        # over the key order cache and yield each.
+        if self._key_order_cache or len(self) < self._lazy_order_min_size:
+            for key in copy(self._key_order()):
+                yield key
+            return
+
+        # Otherwise, work the order out as we go.
+        for key in self._lazy_key_order():
+            yield key
+
+    def _key_order(self):
+        """Return the key order cache, generating it first if necessary.
 
+        The list returned is the cache itself, not a copy; callers must
+        not modify it.
+        """
         # Sanity check: Is there already a cache of the ordered keys?
         #   If so, we don't actually need to do anything.
         if not self._key_order_cache:
-            koc = sorted(super(SortedDict, self).keys(), key=self._cmp)
+            start = default_timer()
+            sort_key = self._sort_key_function()
+            koc = sorted(super(SortedDict, self).keys(), key=sort_key)
             self._key_order_cache = koc
+            if self._stats is not None:
+                self._stats.record_sort(len(koc), start,
+                                        cached=sort_key is not self._cmp)
+        return self._key_order_cache
+
+    def _lazy_key_order(self):
+        """Yield the keys in order, without sorting them all up front.
+
+        The first few keys are selected with a heap, at a cost of
+        O(n log k) rather than O(n log n). Only if iteration continues
+        past them are the rest of the keys sorted; in that case, once
+        every key has been yielded, the order is stored in the key
+        order cache.
+        """
+        version = self._key_set_version
+        keys = list(super(SortedDict, self).keys())
+        sort_key = self._sort_key_function()
+
+        # Work out the sort key of every key once, and hand the same ones
+        # to both the heap and (if it comes to it) the full sort.
+        #
+        # Select the first batch of keys from a heap. `nsmallest` is
+        # stable, so keys which compare equal come out in the same order
+        # that a full sort would give them.
+        start = default_timer()
+        values = list(map(sort_key, keys))
+        batch = heapq.nsmallest(self._lazy_order_batch, keys,
+                                key=replay(values))
+        if self._stats is not None:
+            self._stats.record_sort(len(keys), start, partial=True,
+                                    cached=sort_key is not self._cmp)
+        for key in batch:
+            yield key
 
-        # Iterate over the key order cache and yield each.
-        for key in copy(self._key_order_cache):
+        # The caller wants more than that; sort everything, and carry on
+        # from where the heap left off.
+        start = default_timer()
+        order = sorted(keys, key=replay(values))
+        if self._stats is not None:
+            self._stats.record_sort(len(keys), start, cached=True)
+        for key in order[len(batch):]:
             yield key
 
+        # Cache the order we worked out, unless the keys changed while
+        # we were doing it.
+        if self._key_set_version == version and not self._key_order_cache:
+            self._key_order_cache = order
+
+    def _walk_backwards(self, order, lo, hi):
+        """Yield the keys in `order` from position `hi - 1` down to `lo`,
+        raising RuntimeError if the set of keys changes along the way.
+        """
+        version = self._key_set_version
+        for i in six.moves.range(hi - 1, lo - 1, -1):
+            if self._key_set_version != version:
+                raise RuntimeError('dictionary changed size during iteration')
+            yield order[i]
+
+    def _counted_sort_functions(self):
+        """Return the comparison function and the sort key function (see
+        `_sort_key_function`), wrapped so that calls to the comparison
+        function are counted, if statistics are being recorded.
+        """
+        cmp, sort_key = self._cmp, self._sort_key_function()
+        if self._stats is not None:
+            cmp = self._stats.counting(cmp)
+            if sort_key is self._cmp:
+                sort_key = cmp
+        return cmp, sort_key
+
+    def _sort_key_function(self):
+        """Return the function used to order keys which are already in
+        the dictionary. This is the comparison function, unless a subclass
+        has a faster way to get the same answer.
+        """
+        return self._cmp
+
+    def ordered_equals(self, other):
+        """Return True if `other` has the same keys and values as this
+        dictionary, in the same order, and False otherwise.
+
+        `other` may be any mapping whose `keys` method returns keys in
+        order. If it is another sorted dictionary, the two key order
+        caches are walked side by side, without copying either, stopping
+        at the first difference.
+        """
+        if self is other:
+            return True
+        if len(self) != len(other):
+            return False
+        if isinstance(other, SortedDict):
+            other_keys = other._key_order()
+        else:
+            other_keys = other.keys()
+        for key, other_key in six.moves.zip(self._key_order(), other_keys):
+            if key != other_key or self[key] != other[other_key]:
+                return False
+        return True
+
+    def _canonical_key_order(self):
+        """Yield a (comparison value, key) pair for every key, in key
+        order, except that keys which compare equal are put in order by
+        the keys themselves.
+        """
+        for value, keys in itertools.groupby(self._key_order(),
+                                             self._sort_key_function()):
+            keys = list(keys)
+            if len(keys) > 1:
+                keys.sort()
+            for key in keys:
+                yield value, key
+
+    def _ordered_compare(self, other):
+        """Compare this dictionary with another sorted dictionary using
+        the same comparison function, item by item in key order, and
+        return a negative number, zero, or a positive number (like the
+        `cmp` function in Python 2).
+
+        Keys are compared by their comparison values (and by themselves,
+        if those are equal), then values are compared. If every item
+        matches, the shorter dictionary comes first. Keys which compare
+        equal are taken in order by the keys themselves, rather than in
+        the order they happen to be stored in, so that dictionaries which
+        are equal always compare as equal.
+
+        Return NotImplemented for anything else, since there is no
+        meaningful order between dictionaries sorted differently.
+        """
+        if not isinstance(other, SortedDict) or self._cmp != other._cmp:
+            return NotImplemented
+
+        # Walk the two key orders side by side, stopping at the
+        # first difference.
+        for (a, key), (b, other_key) in six.moves.zip(
+                self._canonical_key_order(), other._canonical_key_order()):
+            if key != other_key:
+                if a == b:
+                    a, b = key, other_key
+                return -1 if a < b else 1
+            value, other_value = self[key], other[other_key]
+            if value != other_value:
+                return -1 if value < other_value else 1
+        return len(self) - len(other)
+
     def pop(self, key, default=NoDefault()):
         """Pop a key-value pair off the dictionary, and return the value.
         If a default value is given, return it instead of raising KeyError
@@ -173,14 +492,32 @@ class SortedDict(dict):
         """
         # If this key is in our key order cache, remove it.
         # (This will always be still safely sorted.)
-        if key in self._key_order_cache:
-            self._key_order_cache.remove(key)
+        self._discard_from_key_order_cache(key)
 
         # Pop the key off the actual dictionary.
         if isinstance(default, NoDefault):
             return super(SortedDict, self).pop(key)
         return super(SortedDict, self).pop(key, default)
 
+    def reversed_items(self):
+        for key in self.reversed_keys():
+            yield (key, self[key])
+
+    def reversed_keys(self):
+        """Return the keys for this dictionary, in reverse order.
+
+        Unlike `keys`, this walks the key order cache in place rather than
+        copying it, so keys must not be added or removed during iteration;
+        if they are, RuntimeError is raised.
+        """
+        order = self._key_order()
+        for key in self._walk_backwards(order, 0, len(order)):
+            yield key
+
+    def reversed_values(self):
+        for key in self.reversed_keys():
+            yield self[key]
+
     def setdefault(self, key, default):
         if key not in self:
             self._clear_key_order_cache()
@@ -190,6 +527,14 @@ class SortedDict(dict):
         super(SortedDict, self).update(other)
         self._clear_key_order_cache()
 
+    def stats(self):
+        """Return a dictionary of the statistics recorded for this
+        instance (or its class), or None if they are not being recorded.
+        """
+        if self._stats is None:
+            return None
+        return self._stats.as_dict()
+
     def values(self):
         for key in self.keys():
             yield self[key]
@@ -0,0 +1,135 @@
+import locale
+import re
+import six
+import weakref
+
+
+class Collation(object):
+    """A collation key function which is expensive enough that its
+    results are worth keeping.
+
+    AlphaSortedDict computes the collation key of each key once, when the
+    key is inserted, and reuses it for every later sort. Collation keys
+    are also interned: the most recently computed ones are shared between
+    every dictionary using this collation, so common repeated strings
+    are neither recomputed nor stored twice. A `maxsize` of zero turns
+    interning off.
+
+    Two collations wrapping the same function are equal.
+    """
+    def __init__(self, func, maxsize=65536):
+        self.func = func
+        self.maxsize = maxsize
+        self._interned = {}
+
+    def __call__(self, key):
+        if not self.maxsize:
+            return self.func(key)
+        try:
+            return self._interned[key]
+        except KeyError:
+            pass
+
+        # Compute the collation key and intern it, making room first
+        # if we have to.
+        answer = self.func(key)
+        if len(self._interned) >= self.maxsize:
+            self._interned.clear()
+        self._interned[key] = answer
+        return answer
+
+    def __eq__(self, other):
+        if not isinstance(other, Collation):
+            return NotImplemented
+        return self.func == other.func
+
+    def __hash__(self):
+        return hash(self.func)
+
+    def __ne__(self, other):
+        answer = self.__eq__(other)
+        if answer is NotImplemented:
+            return answer
+        return not answer
+
+    def __reduce__(self):
+        # The collation shared by every dictionary using this function
+        # should come back as itself, so that unpickled dictionaries
+        # share it too.
+        if _wrapped.get(self.func) is self:
+            return (get_collation, (self.func,))
+        return (Collation, (self.func, self.maxsize))
+
+
+def casefold(key):
+    """Return the key casefolded (a more aggressive form of lowercasing,
+    which handles characters such as the German eszett).
+    """
+    # Python 2 has no casefolding; lowercasing is the nearest thing.
+    if six.PY3:
+        return key.casefold()
+    return key.lower()
+
+
+_digits = re.compile(r'(\d+)')
+
+
+def natural(key):
+    """Return a key which sorts text "naturally": case-insensitively, and
+    with runs of digits compared by numeric value, so that "file2" comes
+    before "file10".
+    """
+    # Splitting on the digits leaves text at the even positions and
+    # digits at the odd ones, so two such keys always compare like
+    # with like.
+    parts = _digits.split(key.lower())
+    parts[1::2] = [int(part) for part in parts[1::2]]
+    return tuple(parts)
+
+
+# The built-in collations, by name. Cheap functions are used directly;
+# expensive ones are wrapped, so their results are kept.
+#
+# Locale collation keys are not interned, since they depend on whatever
+# the locale is when they are computed.
+COLLATIONS = {
+    'casefold': casefold,
+    'locale': Collation(locale.strxfrm, maxsize=0),
+    'lower': six.text_type.lower,
+    'natural': Collation(natural),
+}
+
+# The Collation wrapping each function, so that every dictionary using
+# the same function shares one (and its interned collation keys). Only
+# the Collations are referenced weakly: once nothing uses one, it and
+# its function are forgotten.
+_wrapped = weakref.WeakValueDictionary([
+    (collation.func, collation) for collation in COLLATIONS.values()
+    if isinstance(collation, Collation)
+])
+
+
+def get_collation(collation):
+    """Return the collation key function for the given collation.
+
+    This may be the name of one of the built-in collations ("lower",
+    "casefold", "natural", or "locale"), or any function which takes a
+    text key and returns a value used for ordering. Functions are assumed
+    to be expensive, and are wrapped in a Collation; the same function is
+    given the same Collation for as long as anything is using it.
+    """
+    if isinstance(collation, Collation):
+        return collation
+    if collation is six.text_type.lower or collation is casefold:
+        return collation
+    if callable(collation):
+        try:
+            return _wrapped[collation]
+        except KeyError:
+            return _wrapped.setdefault(collation, Collation(collation))
+        except TypeError:  # The function is unhashable, so cannot be shared.
+            return Collation(collation)
+    try:
+        return COLLATIONS[collation]
+    except KeyError:
+        raise ValueError('Unknown collation: %r.' % (collation,))
@@ -0,0 +1,133 @@
+from copy import deepcopy
+from sdict.base import SortedDict
+from sdict.collation import get_collation
+from sdict.utils import iter_pairs, iter_text_pairs
+import itertools
+import six
+
+
+class FrozenSortedDict(SortedDict):
+    """An immutable, hashable SortedDict.
+
+    The keys are sorted exactly once, on construction, and the order is
+    kept as a tuple. The hash is computed on first use and cached, so
+    frozen dictionaries are cheap to use as dictionary keys or members
+    of sets.
+
+    Two frozen dictionaries are equal if they have the same keys and
+    values in the same order. Comparison with any other mapping is plain
+    dictionary equality.
+    """
+    def __init__(self, __cmp, __data=None, **kwargs):
+        """Create a new frozen sorted dictionary.
+
+        The arguments are the same as for SortedDict.
+        """
+        self._populate(__cmp, itertools.chain(
+            iter_pairs(__data or ()),
+            [(six.text_type(k), v) for k, v in six.iteritems(kwargs)],
+        ))
+
+    @classmethod
+    def _from_sorted_dict(cls, source, order):
+        """Create a frozen copy of the given sorted dictionary, whose keys
+        are already known to be in the given order.
+        """
+        answer = cls.__new__(cls)
+        answer._populate(source._cmp, source, order)
+        return answer
+
+    def _populate(self, cmp, data, order=None):
+        """Fill in this dictionary from `data`, with keys in the given
+        order (or, if no order is given, sorted by `cmp`). This is the
+        only way the contents are ever set.
+        """
+        self._cmp = cmp
+        self._hash = None
+        dict.update(self, iter_pairs(data))
+        if order is None:
+            order = sorted(dict.keys(self), key=cmp)
+        self._key_order_cache = tuple(order)
+
+    def __copy__(self):
+        """Return this instance; it can never change, so there is no
+        reason to copy it.
+        """
+        return self
+
+    def __deepcopy__(self, memo=None):
+        """Create and return a deep copy of this instance."""
+        if not memo:
+            memo = {}
+        order = [deepcopy(key, memo=memo) for key in self._key_order_cache]
+        values = [deepcopy(self[key], memo=memo)
+                  for key in self._key_order_cache]
+        answer = self.__class__.__new__(self.__class__)
+        answer._populate(self._cmp, zip(order, values), order)
+        return answer
+
+    def __eq__(self, other):
+        # Comparisons between frozen dictionaries walk the two key
+        # orders side by side, stopping at the first difference.
+        if not isinstance(other, FrozenSortedDict):
+            return dict.__eq__(self, other)
+        if self._hash is not None and other._hash is not None:
+            if self._hash != other._hash:
+                return False
+        return self.ordered_equals(other)
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash((
+                self._key_order_cache,
+                tuple([self[key] for key in self._key_order_cache]),
+            ))
+        return self._hash
+
+    def __ne__(self, other):
+        answer = self.__eq__(other)
+        if answer is NotImplemented:
+            return answer
+        return not answer
+
+    def __reduce__(self):
+        return (_unpickle, (self.__class__, self._cmp, list(self.items())))
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError('%s objects are immutable.' % type(self).__name__)
+
+    __delitem__ = _immutable
+    __ior__ = _immutable
+    __setitem__ = _immutable
+    clear = _immutable
+    pop = _immutable
+    popitem = _immutable
+    setdefault = _immutable
+    update = _immutable
+
+    def freeze(self):
+        """Return this instance, which is already frozen."""
+        return self
+
+    def _key_order(self):
+        return self._key_order_cache
+
+
+class FrozenAlphaSortedDict(FrozenSortedDict):
+    """An immutable, hashable AlphaSortedDict."""
+    def __init__(self, __data=None, __collation='lower', **kwargs):
+        """Create a new frozen alphabetically sorted dictionary.
+
+        The arguments are the same as for AlphaSortedDict.
+        """
+        self._populate(get_collation(__collation), itertools.chain(
+            iter_text_pairs(__data or ()),
+            iter_text_pairs(kwargs),
+        ))
+
+
+def _unpickle(cls, cmp, items):
+    """Recreate a pickled frozen dictionary."""
+    answer = cls.__new__(cls)
+    answer._populate(cmp, items, [key for key, value in items])
+    return answer
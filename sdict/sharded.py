@@ -0,0 +1,486 @@
+from copy import deepcopy
+from sdict.base import SortedDict
+from sdict.utils import bisect_left, bisect_right, iter_pairs, smart_repr
+import bisect
+import random
+import six
+import threading
+
+try:
+    from collections.abc import MutableMapping
+except ImportError:  # Python 2
+    from collections import MutableMapping
+
+
+class Shard(SortedDict):
+    """A single range partition of a ShardedSortedDict.
+
+    This is an ordinary SortedDict with a lock of its own. A shard is
+    "retired" once the sharded dictionary has replaced it (because it was
+    split, merged, or rebalanced); anyone holding a reference to a retired
+    shard must look the key up again.
+
+    A shard which could not be split (because all its keys compare equal)
+    is not split again until it grows past `split_size` keys.
+    """
+    def __init__(self, __cmp, __data=None):
+        super(Shard, self).__init__(__cmp, __data)
+        self.lock = threading.Lock()
+        self.retired = False
+        self.split_size = 0
+
+
+class ShardedSortedDict(MutableMapping):
+    """A sorted mapping whose keys are split across several range
+    partitions ("shards"), each of which is its own SortedDict with its
+    own lock.
+
+    Writers to different shards do not contend with one another, and
+    invalidating the key order of one shard leaves the others intact.
+    Shards are split in two once they grow past `max_shard_size` keys,
+    and empty shards are merged away.
+
+    Ordered iteration, `index`, and `irange` combine the results of the
+    individual shards, and so behave exactly as they do on SortedDict.
+    """
+    def __init__(self, __cmp, __data=None, shard_count=4,
+                 max_shard_size=65536, **kwargs):
+        """Create a new sharded sorted dictionary.
+
+        The first positional argument is the comparison function, exactly
+        as for SortedDict. The second, if provided, is initial keys and
+        values, which are bulk loaded (see `load`).
+
+        `shard_count` is the number of shards a bulk load into an empty
+        dictionary (or a `rebalance`) spreads the keys across.
+        `max_shard_size` is the number of keys past which a shard is
+        split in two.
+        """
+        self._cmp = __cmp
+        self.shard_count = shard_count
+        self.max_shard_size = max_shard_size
+
+        # The structure lock guards the list of shards and the bounds
+        # between them; each shard's lock guards its contents.
+        #
+        # `_bounds[i]` is the comparison value of the lowest key that
+        # may be stored in `_shards[i + 1]`.
+        self._lock = threading.RLock()
+        self._shards = [Shard(self._cmp)]
+        self._bounds = []
+
+        # Load any initial data.
+        if __data:
+            self.load(__data)
+
+        # If keyword arguments were sent, add them.
+        for k, v in six.iteritems(kwargs):
+            self[six.text_type(k)] = v
+
+    def __contains__(self, key):
+        shard = self._acquire_shard(key)
+        try:
+            return key in shard
+        finally:
+            shard.lock.release()
+
+    def __copy__(self):
+        """Create and return a shallow copy of this instance, with shards
+        (and locks) of its own.
+        """
+        return self._copy(lambda obj: obj)
+
+    def __deepcopy__(self, memo=None):
+        """Create and return a deep copy of this instance."""
+        if not memo:
+            memo = {}
+        return self._copy(lambda obj: deepcopy(obj, memo=memo), memo)
+
+    def __delitem__(self, key):
+        shard = self._acquire_shard(key)
+        try:
+            del shard[key]
+            empty = not shard
+        finally:
+            shard.lock.release()
+
+        # If that emptied the shard, merge it away.
+        if empty:
+            self._merge_empty(shard)
+
+    def __getitem__(self, key):
+        shard = self._acquire_shard(key)
+        try:
+            return shard[key]
+        finally:
+            shard.lock.release()
+
+    def __iter__(self):
+        return self.keys()
+
+    def __reversed__(self):
+        return self.reversed_keys()
+
+    def __len__(self):
+        with self._lock:
+            return sum([len(shard) for shard in self._shards])
+
+    def __repr__(self, object_list=None):
+        """Send down a useful, unambiguous representation of the
+        object.
+        """
+        # Sanity check: Have we rendered this object already?
+        # Avoid a recursion scenario.
+        if not object_list:
+            object_list = []
+        if self in object_list:
+            return '**RECURSION**'
+
+        # Return the repr.
+        return '{%s}' % ', '.join(
+            ['%s: %s' % (
+                smart_repr(k, object_list=object_list + [self]),
+                smart_repr(v, object_list=object_list + [self]),
+            ) for k, v in self.items()],
+        )
+
+    def __setitem__(self, key, value):
+        shard = self._acquire_shard(key)
+        try:
+            shard[key] = value
+            oversized = self._oversized(shard)
+        finally:
+            shard.lock.release()
+
+        # If that pushed the shard past its maximum size, split it.
+        if oversized:
+            self._split(shard)
+
+    def clear(self):
+        with self._lock:
+            for shard in self._shards:
+                with shard.lock:
+                    shard.retired = True
+            self._shards = [Shard(self._cmp)]
+            self._bounds = []
+
+    def index(self, key):
+        """Return the index of the given key. If the key is not
+        present in the dictionary, raise ValueError.
+        """
+        with self._lock:
+            i = self._locate(key)
+            preceding = sum([len(shard) for shard in self._shards[:i]])
+            shard = self._shards[i]
+            with shard.lock:
+                return preceding + shard.index(key)
+
+    def irange(self, start=None, stop=None, descending=False):
+        """Iterate over the keys from `start` (inclusive) up to `stop`
+        (exclusive), in order; or, if `descending` is True, in
+        reverse order.
+
+        Only the shards overlapping the range are consulted.
+        """
+        with self._lock:
+            lo, hi = 0, len(self._shards)
+            if start is not None:
+                lo = self._locate(start)
+            if stop is not None:
+                hi = self._locate(stop) + 1
+            shards = self._shards[lo:hi]
+        if descending:
+            shards.reverse()
+
+        for shard in shards:
+            with shard.lock:
+                keys = list(shard.irange(start, stop, descending))
+            for key in keys:
+                yield key
+
+    def items(self):
+        for shard in self._snapshot():
+            with shard.lock:
+                items = list(shard.items())
+            for item in items:
+                yield item
+
+    def keys(self):
+        """Return the keys for this dictionary, ordered."""
+        for shard in self._snapshot():
+            with shard.lock:
+                keys = list(shard.keys())
+            for key in keys:
+                yield key
+
+    def load(self, data, executor=None):
+        """Bulk load keys and values from a dictionary or an iterable
+        of two-tuples.
+
+        If the dictionary is empty, the shard bounds are first chosen
+        from a sample of the incoming keys, so that the data is spread
+        across `shard_count` shards.
+
+        Each shard is then filled (and its key order generated) as a
+        separate task. If `executor` is given, it should be a
+        `concurrent.futures` thread pool (or anything else with a
+        compatible `map` method), and the shards are filled in parallel.
+        """
+        pairs = list(iter_pairs(data))
+
+        with self._lock:
+            # If there is nothing here yet, choose the shard bounds
+            # based on the data we are about to load.
+            if len(self._shards) == 1:
+                shard = self._shards[0]
+                with shard.lock:
+                    if not shard:
+                        self._reshard(self._sample_bounds(pairs))
+
+            # Divide the incoming data between the shards.
+            buckets = [[] for shard in self._shards]
+            for pair in pairs:
+                buckets[self._locate(pair[0])].append(pair)
+
+            # Fill each shard.
+            tasks = [(shard, bucket) for shard, bucket
+                     in zip(self._shards, buckets) if bucket]
+            if executor is not None:
+                list(executor.map(_fill_shard, tasks))
+            else:
+                for task in tasks:
+                    _fill_shard(task)
+
+            # Split any shards that grew too large.
+            for shard in list(self._shards):
+                if self._oversized(shard):
+                    self._split(shard)
+
+    def pop(self, key, *args):
+        """Pop a key-value pair off the dictionary, and return the value.
+        If a default value is given, return it instead of raising KeyError
+        if the key was not present.
+        """
+        shard = self._acquire_shard(key)
+        try:
+            answer = shard.pop(key, *args)
+            empty = not shard
+        finally:
+            shard.lock.release()
+
+        # If that emptied the shard, merge it away.
+        if empty:
+            self._merge_empty(shard)
+        return answer
+
+    def rebalance(self, shard_count=None):
+        """Redistribute the keys evenly across `shard_count` shards
+        (by default, the `shard_count` given on construction).
+        """
+        shard_count = shard_count or self.shard_count
+        with self._lock:
+            # Take every shard's lock, so nobody is mid-write while we
+            # move their keys around.
+            shards = self._shards
+            for shard in shards:
+                shard.lock.acquire()
+            try:
+                order = []
+                for shard in shards:
+                    order.extend(shard._key_order())
+                bounds = []
+                for i in range(1, shard_count):
+                    split = self._split_point(
+                        order, len(order) * i // shard_count,
+                    )
+                    if split is not None:
+                        bound = self._cmp(order[split])
+                        if not bounds or bounds[-1] < bound:
+                            bounds.append(bound)
+                self._reshard(bounds)
+            finally:
+                for shard in shards:
+                    shard.lock.release()
+
+    def reversed_items(self):
+        for shard in reversed(self._snapshot()):
+            with shard.lock:
+                items = list(shard.reversed_items())
+            for item in items:
+                yield item
+
+    def reversed_keys(self):
+        """Return the keys for this dictionary, in reverse order."""
+        for shard in reversed(self._snapshot()):
+            with shard.lock:
+                keys = list(shard.reversed_keys())
+            for key in keys:
+                yield key
+
+    def reversed_values(self):
+        for key, value in self.reversed_items():
+            yield value
+
+    def values(self):
+        for key, value in self.items():
+            yield value
+
+    def _acquire_shard(self, key):
+        """Find the shard responsible for the given key, acquire its lock,
+        and return it.
+
+        The structure lock is only held long enough to find the shard. If
+        the shard is retired by the time its lock is acquired, look again.
+        """
+        while True:
+            with self._lock:
+                shard = self._shards[self._locate(key)]
+            shard.lock.acquire()
+            if not shard.retired:
+                return shard
+            shard.lock.release()
+
+    def _copy(self, copy_item, memo=None):
+        """Create and return a copy of this instance with the same shard
+        bounds, passing every key and value through `copy_item`.
+        """
+        answer = self.__class__.__new__(self.__class__)
+        if memo is not None:
+            memo[id(self)] = answer
+        answer._cmp = self._cmp
+        answer.shard_count = self.shard_count
+        answer.max_shard_size = self.max_shard_size
+        answer._lock = threading.RLock()
+        with self._lock:
+            answer._bounds = list(self._bounds)
+            answer._shards = []
+            for shard in self._shards:
+                with shard.lock:
+                    order = [copy_item(key) for key in shard._key_order()]
+                    values = [copy_item(shard[key])
+                              for key in shard._key_order()]
+                new_shard = Shard(self._cmp, zip(order, values))
+                new_shard._key_order_cache = order
+                answer._shards.append(new_shard)
+        return answer
+
+    def _locate(self, key):
+        """Return the index of the shard responsible for the given key.
+        The structure lock must be held.
+        """
+        return bisect.bisect_right(self._bounds, self._cmp(key))
+
+    def _merge_empty(self, shard):
+        """Remove an empty shard, extending its neighbor's range
+        to cover it.
+        """
+        with self._lock:
+            with shard.lock:
+                if shard or shard.retired or len(self._shards) == 1:
+                    return
+                i = self._shards.index(shard)
+                shard.retired = True
+                self._shards.pop(i)
+                self._bounds.pop(max(i - 1, 0))
+
+    def _oversized(self, shard):
+        """Return True if the given shard is large enough to be split."""
+        return len(shard) > max(self.max_shard_size, shard.split_size)
+
+    def _reshard(self, bounds):
+        """Replace every shard with a fresh set of shards divided by the
+        given bounds, moving the existing contents across.
+
+        The structure lock, and the lock of every existing shard, must
+        be held.
+        """
+        old_shards = self._shards
+        self._bounds = bounds
+        self._shards = [Shard(self._cmp) for i in range(len(bounds) + 1)]
+        for shard in old_shards:
+            for key in shard._key_order():
+                target = self._shards[self._locate(key)]
+                dict.__setitem__(target, key, shard[key])
+                target._key_order_cache.append(key)
+            shard.retired = True
+
+    def _sample_bounds(self, pairs):
+        """Choose bounds that divide the given data into roughly
+        `shard_count` equally-sized shards, based on a sample of it.
+        """
+        if self.shard_count < 2 or len(pairs) < self.shard_count:
+            return []
+        sample_size = min(len(pairs), self.shard_count * 128)
+        sample = sorted([self._cmp(pair[0]) for pair
+                         in random.sample(pairs, sample_size)])
+        bounds = []
+        for i in range(1, self.shard_count):
+            bound = sample[sample_size * i // self.shard_count]
+            if not bounds or bounds[-1] < bound:
+                bounds.append(bound)
+        return bounds
+
+    def _snapshot(self):
+        """Return a copy of the current list of shards."""
+        with self._lock:
+            return list(self._shards)
+
+    def _split(self, shard):
+        """Split the given shard in two, around its median key."""
+        with self._lock:
+            with shard.lock:
+                if shard.retired or not self._oversized(shard):
+                    return
+                order = shard._key_order()
+                split = self._split_point(order, len(order) // 2)
+                if split is None:
+                    # Every key compares equal. Do not try (and sort the
+                    # shard) again until it has doubled in size.
+                    shard.split_size = 2 * len(shard)
+                    return
+
+                # Create the two new shards. The key order of each half is
+                # already known, so there is no need to sort again.
+                left_keys, right_keys = order[:split], order[split:]
+                left = Shard(self._cmp, [(k, shard[k]) for k in left_keys])
+                left._key_order_cache = left_keys
+                right = Shard(self._cmp, [(k, shard[k]) for k in right_keys])
+                right._key_order_cache = right_keys
+
+                # Swap them in for the old one.
+                i = self._shards.index(shard)
+                shard.retired = True
+                self._shards[i:i + 1] = [left, right]
+                self._bounds.insert(i, self._cmp(order[split]))
+
+            # Either half may itself still be too large (for instance,
+            # after a bulk load); if so, split it again.
+            self._split(left)
+            self._split(right)
+
+    def _split_point(self, order, mid):
+        """Return an index near `mid` at which the given key order can be
+        divided, such that keys which compare equal are kept together.
+        Return None if there is no such index.
+        """
+        if not order:
+            return None
+        value = self._cmp(order[min(mid, len(order) - 1)])
+        split = bisect_left(order, value, self._cmp)
+        if split == 0:
+            # Keys comparing equal run from the very start; try to cut
+            # after them instead.
+            split = bisect_right(order, value, self._cmp)
+        if split == 0 or split == len(order):
+            return None
+        return split
+
+
+def _fill_shard(task):
+    """Add the given pairs to the given shard, and generate its key order.
+    This is a separate function so that it can be sent to an executor.
+    """
+    shard, pairs = task
+    with shard.lock:
+        shard.update(pairs)
+        shard._key_order()
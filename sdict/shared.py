@@ -0,0 +1,351 @@
+from sdict.utils import smart_repr
+import six
+import struct
+import threading
+
+try:
+    from collections.abc import Mapping
+except ImportError:  # Python 2
+    from collections import Mapping
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:  # Python < 3.8
+    resource_tracker = shared_memory = None
+
+
+# The layout of a shared segment is a fixed-size header, followed by a
+# table of (key offset, value offset) pairs in key order, followed by the
+# encoded keys and values themselves.
+_MAGIC = b'SDSM'
+_VERSION = 1
+_HEADER = struct.Struct('<4sB3xQ')
+_ENTRY = struct.Struct('<QQ')
+_LENGTH = struct.Struct('<I')
+_INT = struct.Struct('<q')
+_FLOAT = struct.Struct('<d')
+
+# Held while attaching to a segment on Python < 3.13 (see `_attach`).
+_attach_lock = threading.Lock()
+
+
+class SharedSortedDict(Mapping):
+    """A read-only sorted mapping whose keys, values, and key order live
+    in a `multiprocessing.shared_memory` segment.
+
+    A SortedDict is frozen into a segment once, with `create`; any number
+    of processes may then attach to the segment by name. Nothing is
+    pickled or copied per process: lookups binary search the key order in
+    place and only decode the entries they touch.
+
+    Keys and values may be None, booleans, integers, floats, text,
+    or bytes.
+    """
+    def __init__(self, __cmp, name):
+        """Attach to the existing shared segment with the given name.
+
+        The first positional argument is the comparison function. It
+        must order keys exactly as the comparison function of the
+        dictionary the segment was created from did. For a segment
+        created from an AlphaSortedDict, use the same collation, from
+        `sdict.collation.get_collation` (`six.text_type.lower`, for the
+        default collation).
+        """
+        if shared_memory is None:
+            raise RuntimeError('Shared memory requires Python 3.8 or later.')
+
+        # Save the comparison function being used.
+        self._cmp = __cmp
+
+        # Attach to the segment.
+        self._shm = _attach(name)
+
+        # Read the header.
+        magic, version, self._len = _HEADER.unpack_from(self._shm.buf, 0)
+        if magic != _MAGIC or version != _VERSION:
+            self._shm.close()
+            raise ValueError('%r is not a shared sorted dictionary.' % name)
+
+    @classmethod
+    def create(cls, source, name=None):
+        """Freeze the given SortedDict into a new shared segment, and
+        return a SharedSortedDict attached to it.
+
+        If `name` is not given, a unique name is chosen; either way, it
+        is available as the `name` attribute of the returned object, for
+        other processes to attach with.
+
+        The caller owns the segment, and should call `unlink` once every
+        process is done with it.
+        """
+        if shared_memory is None:
+            raise RuntimeError('Shared memory requires Python 3.8 or later.')
+
+        # Encode every key and value, in key order.
+        order = source._key_order()
+        table_size = _HEADER.size + _ENTRY.size * len(order)
+        chunks = []
+        entries = []
+        offset = table_size
+        for key in order:
+            encoded_key = _encode(key)
+            encoded_value = _encode(source[key])
+            entries.append((offset, offset + len(encoded_key)))
+            offset += len(encoded_key) + len(encoded_value)
+            chunks.append(encoded_key)
+            chunks.append(encoded_value)
+
+        # Create the segment and write everything into it.
+        shm = shared_memory.SharedMemory(
+            name=name,
+            create=True,
+            size=max(offset, 1),
+        )
+        buf = shm.buf
+        _HEADER.pack_into(buf, 0, _MAGIC, _VERSION, len(order))
+        for i, entry in enumerate(entries):
+            _ENTRY.pack_into(buf, _HEADER.size + _ENTRY.size * i, *entry)
+        offset = table_size
+        for chunk in chunks:
+            buf[offset:offset + len(chunk)] = chunk
+            offset += len(chunk)
+        del buf
+
+        # Attach to it, reusing our handle.
+        answer = cls.__new__(cls)
+        answer._cmp = source._cmp
+        answer._shm = shm
+        answer._len = len(order)
+        return answer
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __getitem__(self, key):
+        i = self._find(key)
+        if i is None:
+            raise KeyError(key)
+        return self._value_at(i)
+
+    def __iter__(self):
+        return self.keys()
+
+    def __reversed__(self):
+        return self.reversed_keys()
+
+    def __len__(self):
+        return self._len
+
+    def __repr__(self, object_list=None):
+        """Send down a useful, unambiguous representation of the
+        object.
+        """
+        # Sanity check: Have we rendered this object already?
+        # Avoid a recursion scenario.
+        if not object_list:
+            object_list = []
+        if self in object_list:
+            return '**RECURSION**'
+
+        # Return the repr.
+        return '{%s}' % ', '.join(
+            ['%s: %s' % (
+                smart_repr(k, object_list=object_list + [self]),
+                smart_repr(v, object_list=object_list + [self]),
+            ) for k, v in self.items()],
+        )
+
+    @property
+    def name(self):
+        """The name of the shared segment, for other processes to
+        attach with.
+        """
+        return self._shm.name
+
+    def close(self):
+        """Detach from the shared segment. The segment itself remains
+        until `unlink` is called.
+        """
+        self._shm.close()
+
+    def index(self, key):
+        """Return the index of the given key. If the key is not
+        present in the dictionary, raise ValueError.
+        """
+        i = self._find(key)
+        if i is None:
+            raise ValueError('%r is not in the dictionary.' % (key,))
+        return i
+
+    def irange(self, start=None, stop=None, descending=False):
+        """Iterate over the keys from `start` (inclusive) up to `stop`
+        (exclusive), in order; or, if `descending` is True, in
+        reverse order.
+        """
+        lo, hi = 0, self._len
+        if start is not None:
+            lo = self._bisect_left(self._cmp(start))
+        if stop is not None:
+            hi = self._bisect_left(self._cmp(stop), lo=lo)
+        indexes = six.moves.range(lo, hi)
+        if descending:
+            indexes = reversed(indexes)
+        for i in indexes:
+            yield self._key_at(i)
+
+    def items(self):
+        for i in six.moves.range(self._len):
+            yield (self._key_at(i), self._value_at(i))
+
+    def keys(self):
+        """Return the keys for this dictionary, ordered."""
+        for i in six.moves.range(self._len):
+            yield self._key_at(i)
+
+    def reversed_items(self):
+        for i in reversed(six.moves.range(self._len)):
+            yield (self._key_at(i), self._value_at(i))
+
+    def reversed_keys(self):
+        """Return the keys for this dictionary, in reverse order."""
+        for i in reversed(six.moves.range(self._len)):
+            yield self._key_at(i)
+
+    def reversed_values(self):
+        for i in reversed(six.moves.range(self._len)):
+            yield self._value_at(i)
+
+    def unlink(self):
+        """Destroy the shared segment. This should be called once, by
+        the process that created it.
+        """
+        self._shm.unlink()
+
+    def values(self):
+        for i in six.moves.range(self._len):
+            yield self._value_at(i)
+
+    def _bisect_left(self, value, lo=0):
+        """Return the index of the first key whose comparison value is
+        not less than `value`.
+        """
+        hi = self._len
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._cmp(self._key_at(mid)) < value:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _find(self, key):
+        """Return the index of the given key, or None if it is not
+        present.
+        """
+        # Several keys may share a comparison value; look at each of them.
+        value = self._cmp(key)
+        i = self._bisect_left(value)
+        while i < self._len:
+            candidate = self._key_at(i)
+            if candidate == key:
+                return i
+            if value < self._cmp(candidate):
+                break
+            i += 1
+        return None
+
+    def _key_at(self, i):
+        entry = _HEADER.size + _ENTRY.size * i
+        offset = _ENTRY.unpack_from(self._shm.buf, entry)[0]
+        return _decode(self._shm.buf, offset)
+
+    def _value_at(self, i):
+        entry = _HEADER.size + _ENTRY.size * i
+        offset = _ENTRY.unpack_from(self._shm.buf, entry)[1]
+        return _decode(self._shm.buf, offset)
+
+
+def _attach(name):
+    """Attach to the existing shared segment with the given name, without
+    registering it with this process's resource tracker.
+
+    Registering it would have the tracker destroy the segment when this
+    process exits; that is the job of whoever created it. Undoing the
+    registration afterwards is no good either, since processes started
+    by `spawn` or `forkserver` share their parent's tracker, and so the
+    creator's own registration would go with it.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13
+        pass
+
+    # Older versions always register the segment, so skip the
+    # registration of this one segment while attaching to it.
+    register = resource_tracker.register
+    skipped = name.lstrip('/')
+
+    def register_others(resource, rtype):
+        if rtype != 'shared_memory' or resource.lstrip('/') != skipped:
+            register(resource, rtype)
+    with _attach_lock:
+        resource_tracker.register = register_others
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+def _encode(obj):
+    """Encode a single key or value as a type tag followed by its
+    payload.
+    """
+    if obj is None:
+        return b'N'
+    if obj is True:
+        return b'T'
+    if obj is False:
+        return b'F'
+    if isinstance(obj, six.integer_types):
+        try:
+            return b'q' + _INT.pack(obj)
+        except struct.error:
+            payload = str(obj).encode('ascii')
+            return b'i' + _LENGTH.pack(len(payload)) + payload
+    if isinstance(obj, float):
+        return b'd' + _FLOAT.pack(obj)
+    if isinstance(obj, six.text_type):
+        payload = obj.encode('utf-8')
+        return b's' + _LENGTH.pack(len(payload)) + payload
+    if isinstance(obj, six.binary_type):
+        return b'b' + _LENGTH.pack(len(obj)) + obj
+    raise TypeError('Cannot store %s objects in shared memory.' %
+                    type(obj).__name__)
+
+
+def _decode(buf, offset):
+    """Decode the key or value stored at the given offset."""
+    tag = buf[offset:offset + 1].tobytes()
+    offset += 1
+    if tag == b'N':
+        return None
+    if tag == b'T':
+        return True
+    if tag == b'F':
+        return False
+    if tag == b'q':
+        return _INT.unpack_from(buf, offset)[0]
+    if tag == b'd':
+        return _FLOAT.unpack_from(buf, offset)[0]
+
+    # Everything else has a length-prefixed payload.
+    length = _LENGTH.unpack_from(buf, offset)[0]
+    payload = buf[offset + _LENGTH.size:offset + _LENGTH.size + length]
+    if tag == b's':
+        return six.text_type(payload, 'utf-8')
+    if tag == b'b':
+        return payload.tobytes()
+    return int(payload.tobytes())
@@ -0,0 +1,63 @@
+from timeit import default_timer
+
+
+class SortStats(object):
+    """Counters and timings describing the work a sorted dictionary does
+    to keep its keys in order.
+
+    The counters are:
+
+      * invalidations: times the key order cache was thrown away.
+      * rebuilds: times the full key order was sorted from scratch.
+      * partial_sorts: times the first few keys were selected lazily,
+        without a full sort.
+      * sort_time: seconds spent in rebuilds and partial sorts.
+      * cmp_calls: calls to the comparison function while sorting or
+        searching the key order.
+      * removals: linear scans of the key order cache to remove a key.
+
+    If a hook is provided, it is called as `hook(name, amount)` every time
+    a counter changes, so the numbers can be sent on to a metrics system
+    as they happen.
+    """
+    names = ('invalidations', 'rebuilds', 'partial_sorts', 'sort_time',
+             'cmp_calls', 'removals')
+
+    def __init__(self, hook=None):
+        self.hook = hook
+        self.reset()
+
+    def as_dict(self):
+        """Return a copy of the current counters."""
+        return dict(self.counters)
+
+    def counting(self, func):
+        """Return a version of the given comparison function which counts
+        its calls.
+        """
+        def counted(key):
+            self.record('cmp_calls')
+            return func(key)
+        return counted
+
+    def record(self, name, amount=1):
+        """Add `amount` to the named counter."""
+        self.counters[name] += amount
+        if self.hook is not None:
+            self.hook(name, amount)
+
+    def record_sort(self, key_count, start, partial=False, cached=False):
+        """Record a sort (or lazy partial sort) of `key_count` keys, which
+        began at the given `default_timer` time.
+
+        If `cached` is True, the keys' sort keys were looked up rather than
+        computed, so the comparison function was not called.
+        """
+        self.record('sort_time', default_timer() - start)
+        if not cached:
+            self.record('cmp_calls', key_count)
+        self.record('partial_sorts' if partial else 'rebuilds')
+
+    def reset(self):
+        """Set every counter back to zero."""
+        self.counters = dict([(name, 0) for name in self.names])
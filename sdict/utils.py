@@ -1,6 +1,12 @@
+import functools
 import six
 
 
+# Iterate over a dictionary's items in its native (unsorted) order, even
+# if it is a SortedDict.
+_iteritems = dict.items if six.PY3 else dict.iteritems
+
+
 def smart_repr(obj, object_list=None):
     """Return a repr of the object, using the object's __repr__ method.
     Be smart and pass the depth value if and only if it's accepted.
@@ -16,3 +22,76 @@ def smart_repr(obj, object_list=None):
     except AttributeError:
         pass
     return repr(obj)
+
+
+def bisect_left(seq, value, key, lo=0, hi=None):
+    """Return the leftmost position at which `value` could be inserted
+    into `seq` while keeping it in order.
+
+    `seq` must already be ordered by `key`. Unlike the standard library's
+    `bisect` module, every item in `seq` is passed through `key` before
+    being compared, but `value` itself is not.
+    """
+    if hi is None:
+        hi = len(seq)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if key(seq[mid]) < value:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def bisect_right(seq, value, key, lo=0, hi=None):
+    """Return the rightmost position at which `value` could be inserted
+    into `seq` while keeping it in order.
+
+    See `bisect_left` for how `key` is applied.
+    """
+    if hi is None:
+        hi = len(seq)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if value < key(seq[mid]):
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+
+def iter_pairs(data):
+    """Iterate over the (key, value) pairs in a dictionary, any other
+    mapping, or an iterable of two-tuples, without copying it first.
+
+    Dictionaries (including sorted ones) are walked in their native
+    order, since there is no reason to sort them.
+    """
+    if isinstance(data, dict):
+        return _iteritems(data)
+    if hasattr(data, 'keys'):
+        return ((key, data[key]) for key in data.keys())
+    return iter(data)
+
+
+def iter_text_pairs(data):
+    """Iterate over the (key, value) pairs in a dictionary, any other
+    mapping, or an iterable of two-tuples (see `iter_pairs`), coercing
+    any keys which are not already text.
+    """
+    text_type = six.text_type
+    for key, value in iter_pairs(data):
+        if type(key) is not text_type:
+            key = text_type(key)
+        yield key, value
+
+
+def replay(values):
+    """Return a key function which ignores its argument, and returns each
+    of `values` in turn.
+
+    Both `sorted` and `heapq.nsmallest` call their key function exactly
+    once per item, in order, so this lets them reuse sort keys which have
+    already been worked out for the same items.
+    """
+    return functools.partial(next, iter(values))
@@ -0,0 +1,124 @@
+from sdict.base import SortedDict
+from sdict.utils import bisect_left, bisect_right, iter_pairs
+
+
+class WindowedSortedDict(SortedDict):
+    """A SortedDict which only keeps the keys within a sliding window:
+    those no more than `horizon` behind the newest key, measured in
+    comparison values.
+
+    This suits keys such as timestamps. For instance, with numeric
+    timestamps in seconds as keys, a horizon of 300 keeps the last five
+    minutes of data.
+
+    New keys are placed directly into the key order, rather than throwing
+    it away, and keys which fall out of the window are dropped together,
+    with a single slice of the key order.
+    """
+    def __init__(self, __cmp, __horizon, __data=None, on_expire=None,
+                 expire_on_insert=True):
+        """Create a new windowed sorted dictionary.
+
+        The first positional argument is the comparison function, exactly
+        as for SortedDict; it must return numbers (or anything else from
+        which the horizon can be subtracted). The second is the horizon.
+        The third, if provided, is initial keys and values.
+
+        If `on_expire` is provided, it is called with a list of the
+        (key, value) pairs dropped every time any keys expire.
+
+        If `expire_on_insert` is True (the default), old keys are expired
+        every time a key is added. Otherwise, call `expire` when
+        appropriate. Every expiry shifts the whole key order down, so if
+        keys arrive at a high rate, expiring periodically is considerably
+        cheaper than expiring on every insert.
+        """
+        self.horizon = __horizon
+        self.on_expire = on_expire
+        self.expire_on_insert = expire_on_insert
+        super(WindowedSortedDict, self).__init__(__cmp, __data)
+        if self.expire_on_insert:
+            self.expire()
+
+    def __reduce__(self):
+        # Unpickling adds the items before restoring instance attributes,
+        # so rebuild the dictionary with expiry turned off, and let the
+        # attributes turn it back on afterwards.
+        return (
+            self.__class__,
+            (self._cmp, self.horizon, None, None, False),
+            self.__dict__,
+            None,
+            iter(iter_pairs(self)),
+        )
+
+    def __setitem__(self, key, value):
+        # If the key order is known, put a new key straight into it,
+        # rather than throwing the order away. Keys which compare equal
+        # go after those already present, as they would in a full sort.
+        if key not in self and self._key_order_cache:
+            order = self._key_order_cache
+            sort_key = self._sort_key_function()
+            cmp_value = self._cmp(key)
+
+            # Keys most often arrive in order (timestamps usually do), so
+            # check whether this one simply goes on the end first.
+            if not cmp_value < sort_key(order[-1]):
+                order.append(key)
+            else:
+                order.insert(bisect_right(order, cmp_value, sort_key), key)
+            self._key_set_version += 1
+            dict.__setitem__(self, key, value)
+        else:
+            super(WindowedSortedDict, self).__setitem__(key, value)
+
+        # Drop anything which has fallen out of the window.
+        if self.expire_on_insert:
+            self.expire()
+
+    def expire(self, now=None):
+        """Drop every key more than `horizon` behind `now` (by default,
+        the newest key), and return the dropped (key, value) pairs,
+        in order.
+        """
+        order = self._key_order()
+        if not order:
+            return []
+
+        # Find everything before the cutoff, and remove it from the key
+        # order in a single slice.
+        if now is None:
+            now = order[-1]
+        cutoff = self._cmp(now) - self.horizon
+        sort_key = self._sort_key_function()
+        if not sort_key(order[0]) < cutoff:
+            return []
+        i = bisect_left(order, cutoff, sort_key)
+        expired_keys = order[:i]
+        del order[:i]
+        self._key_set_version += 1
+
+        # Remove the same keys from the dictionary itself.
+        expired = [(key, dict.pop(self, key)) for key in expired_keys]
+        if self.on_expire is not None:
+            self.on_expire(expired)
+        return expired
+
+    def setdefault(self, key, default):
+        if key not in self:
+            self[key] = default
+            return default
+        return self[key]
+
+    def update(self, other):
+        super(WindowedSortedDict, self).update(other)
+        if self.expire_on_insert:
+            self.expire()
+
+    def _blank(self):
+        return self.__class__(
+            self._cmp,
+            self.horizon,
+            on_expire=self.on_expire,
+            expire_on_insert=self.expire_on_insert,
+        )
@@ -1,10 +1,27 @@
 #!/usr/bin/env python
 from copy import copy, deepcopy
-from sdict import sdict, adict
+from sdict import sdict, adict, fsdict, fadict
+from sdict import ShardedSortedDict, SharedSortedDict, WindowedSortedDict
+from sdict import collation, shared
 from sdict.base import NoDefault
+from sdict.collation import Collation
+import gc
+import os
+import pickle
+import shutil
+import subprocess
+import sys
+import tempfile
 import types
 import six
 
+# asyncio support is only available on Python 3.7 and up.
+try:
+    from sdict import aio
+    import asyncio
+except (ImportError, SyntaxError):
+    aio = None
+
 # Import unittest2 if we have it, unittest otherwise.
 # unittest2 is required for Python 2.6, optional thereafter.
 try:
@@ -36,6 +53,80 @@ class BaseSuite(unittest.TestCase):
         self.assertNotEqual(self.x['x'], y['x'])
         self.assertEqual([k for k in y], ['z', 'x', 'B', 'a'])
 
+    def test_reversed(self):
+        """Test iterating over keys, items, and values in reverse."""
+        self.assertEqual([k for k in reversed(self.x)], ['a', 'B', 'x', 'z'])
+        self.assertEqual([v for v in self.x.reversed_values()][:2], [0, 1])
+        self.assertEqual([i for i in self.x.reversed_items()][-1], ('z', 10))
+        self.assertEqual([k for k in self.x.irange('y', 'a', True)],
+                         ['B', 'x'])
+
+    def test_reversed_mutation(self):
+        """Test that reverse iteration, which does not copy the key order,
+        refuses to carry on if keys are added or removed.
+        """
+        keys = reversed(self.x)
+        self.assertEqual(next(keys), 'a')
+        self.x['x'] = 'changed'
+        self.assertEqual(next(keys), 'B')
+        del self.x['z']
+        with self.assertRaises(RuntimeError):
+            next(keys)
+
+    def test_reversed_missing_key(self):
+        """Test that failing to remove a key which is not there does not
+        stop reverse iteration.
+        """
+        keys = reversed(self.x)
+        self.assertEqual(next(keys), 'a')
+        self.assertIsNone(self.x.pop('missing', None))
+        with self.assertRaises(KeyError):
+            del self.x['missing']
+        self.assertEqual(next(keys), 'B')
+
+    def test_lazy_order(self):
+        """Test that keys are produced incrementally from an unsorted
+        dictionary, and that the order is only cached once iteration
+        finishes.
+        """
+        x = sdict(lambda k: -k, [(i, i) for i in range(100)])
+        x._lazy_order_min_size = 0
+        keys = x.keys()
+        self.assertEqual([next(keys) for i in range(3)], [99, 98, 97])
+        self.assertEqual(x._key_order_cache, [])
+        self.assertEqual(list(keys), list(range(96, -1, -1)))
+        self.assertEqual(x._key_order_cache, list(range(99, -1, -1)))
+
+    def test_lazy_order_ties(self):
+        """Test that keys which compare equal come out of lazy ordering
+        just as they would from a full sort.
+        """
+        x = sdict(lambda k: k % 3, [(i, i) for i in range(30)])
+        x._lazy_order_min_size = 0
+        self.assertEqual([k for k in x.keys()],
+                         sorted(range(30), key=lambda k: k % 3))
+
+    def test_lazy_order_mutation(self):
+        """Test that an order worked out lazily is not cached if the keys
+        change part way through.
+        """
+        x = sdict(lambda k: k, [(i, i) for i in range(20)])
+        x._lazy_order_min_size = 0
+        keys = x.keys()
+        next(keys)
+        del x[10]
+        self.assertEqual(len(list(keys)), 19)
+        self.assertEqual(x._key_order_cache, [])
+        self.assertEqual(len([k for k in x.keys()]), 19)
+
+    def test_irange(self):
+        """Test iterating over a range of keys."""
+        self.assertEqual([k for k in self.x.irange('y', 'b')], ['x'])
+        self.assertEqual([k for k in self.x.irange('x', 'b')], ['x'])
+        self.assertEqual([k for k in self.x.irange('x', 'B')], ['x'])
+        self.assertEqual([k for k in self.x.irange(stop='x')], ['z'])
+        self.assertEqual([k for k in self.x.irange('b')], ['B', 'a'])
+
 
 class AlphaSuite(unittest.TestCase):
     def test_init_dict(self):
@@ -46,6 +137,24 @@ class AlphaSuite(unittest.TestCase):
         self.assertEqual([k for k in x.keys()], ['a', 'B', 'y', 'z'])
         self.assertEqual([v for v in x.values()], ['x', [], '0', 5])
 
+    def test_init_pairs(self):
+        """Test initialization of alpha sorted dictionaries using
+        a stream of pairs.
+        """
+        x = adict((k, v) for k, v in [('z', 5), (1, 'one'), ('a', 'x')])
+        self.assertEqual([k for k in x.keys()], ['1', 'a', 'z'])
+        self.assertEqual([v for v in x.values()], ['one', 'x', 5])
+
+    def test_init_sorted_dict(self):
+        """Test initialization of alpha sorted dictionaries using
+        another sorted dictionary.
+        """
+        x = adict(adict(b=1, a=2), c=3)
+        self.assertEqual([i for i in x.items()],
+                         [('a', 2), ('b', 1), ('c', 3)])
+        y = adict(sdict(lambda k: -k, { 2: 'b', 1: 'a' }))
+        self.assertEqual([i for i in y.items()], [('1', 'a'), ('2', 'b')])
+
     def test_init_kwargs(self):
         """Test initialization of alpha sorted dictionaries using
         keyword arguments.
@@ -115,6 +224,9 @@ class AlphaSuite(unittest.TestCase):
         x.update({ 'a': 0, 'b': -1 })
         self.assertEqual([k for k in x.keys()], ['a', 'b', 'y', 'z'])
         self.assertEqual([v for v in x.values()], [0, -1, 1, 2])
+        x.update([(1, 'one'), ('z', 3)])
+        self.assertEqual([k for k in x.keys()], ['1', 'a', 'b', 'y', 'z'])
+        self.assertEqual(x['z'], 3)
 
     def test_equality(self):
         """Test equality with plain dictionaries, ensuring they act like
@@ -208,6 +320,15 @@ class AlphaSuite(unittest.TestCase):
         self.assertEqual(x['z'], y['z'])
         self.assertNotEqual(id(x['z']), id(y['z']))
 
+    def test_pickle(self):
+        """Test pickling of the dictionary."""
+        x = adict(b=1, a=2)
+        y = pickle.loads(pickle.dumps(x))
+        self.assertEqual(x, y)
+        self.assertEqual([k for k in y], ['a', 'b'])
+        y['c'] = 3
+        self.assertEqual([k for k in y], ['a', 'b', 'c'])
+
     def test_del_after_keys(self):
         """Test that we can delete after generating a key cache."""
         x = adict(a='x', b='y', c='z')
@@ -282,6 +403,756 @@ class AlphaSuite(unittest.TestCase):
             self.assertIsInstance(x.items(), list)
 
 
+class ComparisonSuite(unittest.TestCase):
+    def test_ordered_equals(self):
+        """Test comparing keys, values, and their order all at once."""
+        x = adict(a=1, b=2)
+        self.assertTrue(x.ordered_equals(adict(b=2, a=1)))
+        self.assertTrue(x.ordered_equals(x))
+        self.assertFalse(x.ordered_equals(adict(a=1, b=3)))
+        self.assertFalse(x.ordered_equals(adict(a=1)))
+        self.assertFalse(x.ordered_equals(sdict(lambda k: -ord(k), x)))
+        self.assertTrue(x.ordered_equals(fadict(a=1, b=2)))
+        self.assertTrue(x.ordered_equals(ShardedSortedDict(ord, x)))
+        self.assertFalse(x.ordered_equals({ 'b': 2, 'a': 1 }))
+
+    def test_ordered_equals_ties(self):
+        """Test that dictionaries holding the same items in a different
+        order are not ordered-equal, even though they are equal.
+        """
+        x = adict([('a', 1), ('A', 2)])
+        y = adict([('A', 2), ('a', 1)])
+        self.assertEqual(x, y)
+        self.assertFalse(x.ordered_equals(y))
+
+    def test_ordered_equals_does_not_copy(self):
+        """Test that ordered comparison walks the key order caches
+        without sorting again.
+        """
+        x = adict(a=1, b=2)
+        y = adict(a=1, b=2)
+        [k for k in x]
+        [k for k in y]
+        x.enable_stats()
+        self.assertTrue(x.ordered_equals(y))
+        self.assertTrue(x <= y)
+        self.assertEqual(x.stats()['rebuilds'], 0)
+
+    def test_rich_comparisons(self):
+        """Test ordering sorted dictionaries which share a comparison
+        function, item by item.
+        """
+        x = adict(a=1, b=2)
+        self.assertTrue(x < adict(a=1, c=0))
+        self.assertTrue(x < adict(a=2))
+        self.assertTrue(x > adict(a=1))
+        self.assertTrue(x > adict(A=1, b=2))
+        self.assertTrue(x <= adict(a=1, b=2))
+        self.assertTrue(x >= adict(a=1, b=2))
+        self.assertFalse(x < adict(a=1, b=2))
+        self.assertTrue(adict() < x)
+
+    def test_rich_comparisons_ties(self):
+        """Test that equal dictionaries compare as equal, whatever order
+        keys which compare equal are stored in.
+        """
+        x = adict([('a', 1), ('A', 2)])
+        y = adict([('A', 2), ('a', 1)])
+        self.assertEqual(x, y)
+        self.assertTrue(x <= y)
+        self.assertTrue(x >= y)
+        self.assertFalse(x < y)
+        self.assertFalse(x > y)
+        self.assertTrue(x < adict([('a', 1), ('A', 3)]))
+        self.assertTrue(adict([('a', 2)]) > y)
+
+    def test_rich_comparisons_unrelated(self):
+        """Test that dictionaries sorted differently cannot be ordered."""
+        x = adict(a=1)
+        if six.PY3:
+            with self.assertRaises(TypeError):
+                x < sdict(len, { 'a': 1 })
+            with self.assertRaises(TypeError):
+                x >= { 'a': 1 }
+
+
+class AsyncSuite(unittest.TestCase):
+    def setUp(self):
+        if aio is None:
+            self.skipTest('asyncio support requires Python 3.7 or later.')
+        self.aio = aio
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def drain(self, aiterator):
+        """Run the given asynchronous iterator to completion, and return
+        everything it yields.
+        """
+        answer = []
+        while True:
+            try:
+                answer.append(self.loop.run_until_complete(
+                    aiterator.__anext__(),
+                ))
+            except StopAsyncIteration:
+                return answer
+
+    def ticking(self, coroutine):
+        """Run the given coroutine, and return how many times it let
+        the event loop do something else.
+        """
+        ticks = []
+
+        def tick():
+            ticks.append(None)
+            if not future.done():
+                self.loop.call_soon(tick)
+        future = asyncio.ensure_future(coroutine, loop=self.loop)
+        self.loop.call_soon(tick)
+        self.loop.run_until_complete(future)
+        return len(ticks)
+
+    def test_iteration(self):
+        """Test asynchronous iteration over keys, items, and values."""
+        x = adict(c=3, a=1, b=2)
+        self.assertEqual(self.drain(self.aio.aiter_keys(x)), ['a', 'b', 'c'])
+        self.assertEqual(self.drain(self.aio.aiter_items(x)),
+                         [('a', 1), ('b', 2), ('c', 3)])
+        self.assertEqual(self.drain(self.aio.aiter_values(x)), [1, 2, 3])
+
+    def test_iteration_snapshot(self):
+        """Test that asynchronous iteration is over a snapshot of the
+        keys, just like synchronous iteration.
+        """
+        x = adict(c=3, a=1, b=2)
+        keys = self.aio.aiter_keys(x)
+        self.assertEqual(self.loop.run_until_complete(keys.__anext__()), 'a')
+        x['aa'] = 0
+        self.assertEqual(self.drain(keys), ['b', 'c'])
+
+    def test_iteration_yields(self):
+        """Test that iteration hands control back to the event loop
+        after every chunk.
+        """
+        from unittest import mock
+        x = sdict(lambda k: k, [(i, i) for i in range(100)])
+        sleep = asyncio.sleep
+        with mock.patch.object(asyncio, 'sleep', side_effect=sleep) as m:
+            keys = self.drain(self.aio.aiter_keys(x, chunk_size=10))
+        self.assertEqual(keys, list(range(100)))
+        self.assertEqual(m.call_count, 10)
+
+    def test_load(self):
+        """Test bulk loading, yielding as we go, with the sort run in
+        an executor.
+        """
+        try:
+            from concurrent.futures import ThreadPoolExecutor
+        except ImportError:
+            self.skipTest('concurrent.futures is not available.')
+        x = adict()
+        data = dict([(six.text_type(i), i) for i in range(100)])
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            ticks = self.ticking(self.aio.load(x, data, chunk_size=10,
+                                               executor=executor))
+        self.assertTrue(ticks >= 10)
+        self.assertEqual(x._key_order_cache, sorted(data))
+        self.assertEqual(len(x), 100)
+
+    def test_key_order_collated(self):
+        """Test that sorting in an executor reuses the collation keys a
+        dictionary has already worked out.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        calls = []
+
+        def collate(key):
+            calls.append(key)
+            return -int(key)
+        x = adict(dict([(six.text_type(i), i) for i in range(100)]),
+                  Collation(collate, maxsize=10))
+        del calls[:]
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            order = self.loop.run_until_complete(
+                self.aio.key_order(x, executor=executor))
+        self.assertEqual(order, [six.text_type(i) for i in range(99, -1, -1)])
+        self.assertEqual(x._key_order_cache, order)
+        self.assertEqual(calls, [])
+
+
+class StatsSuite(unittest.TestCase):
+    def tearDown(self):
+        sdict.disable_class_stats()
+        adict.disable_class_stats()
+
+    def test_disabled(self):
+        """Test that no statistics are recorded by default."""
+        x = adict(a=1)
+        self.assertIsNone(x.stats())
+
+    def test_instance(self):
+        """Test recording statistics for a single instance."""
+        x = adict(a=1, b=2, c=3)
+        y = adict(a=1)
+        x.enable_stats()
+        self.assertEqual([k for k in x], ['a', 'b', 'c'])
+        x['d'] = 4
+        del x['a']
+        self.assertEqual(x.index('c'), 1)
+        del x['b']
+        stats = x.stats()
+        self.assertEqual(stats['invalidations'], 1)
+        self.assertEqual(stats['rebuilds'], 2)
+        self.assertEqual(stats['removals'], 1)
+        self.assertTrue(stats['cmp_calls'] >= 6)
+        self.assertTrue(stats['sort_time'] >= 0)
+        self.assertIsNone(y.stats())
+        x.disable_stats()
+        self.assertIsNone(x.stats())
+
+    def test_class(self):
+        """Test recording statistics aggregated across a class, and
+        sending them to a hook.
+        """
+        events = []
+        adict.enable_class_stats(hook=lambda *args: events.append(args))
+        x = adict(a=1)
+        y = adict(b=1)
+        [k for k in x]
+        [k for k in y]
+        self.assertEqual(x.stats()['rebuilds'], 2)
+        self.assertEqual(x.stats(), y.stats())
+        self.assertTrue(('rebuilds', 1) in events)
+        self.assertIsNone(sdict(len).stats())
+
+    def test_class_inherited(self):
+        """Test that statistics enabled for a class are recorded for its
+        subclasses, even once disabled for the subclass itself.
+        """
+        adict.enable_class_stats()
+        adict.disable_class_stats()
+        stats = sdict.enable_class_stats()
+        [k for k in adict(a=1)]
+        self.assertEqual(stats.counters['rebuilds'], 1)
+        sdict.disable_class_stats()
+        self.assertIsNone(adict(a=1).stats())
+
+    def test_partial_sorts(self):
+        """Test that lazy ordering is recorded separately."""
+        x = sdict(lambda k: k, [(i, i) for i in range(100)])
+        x._lazy_order_min_size = 0
+        x.enable_stats()
+        [k for k in x]
+        self.assertEqual(x.stats()['partial_sorts'], 1)
+        self.assertEqual(x.stats()['rebuilds'], 1)
+        self.assertEqual(x.stats()['cmp_calls'], 100)
+
+    def test_cached_collation(self):
+        """Test that looking up cached collation keys is not counted as
+        calling the comparison function.
+        """
+        x = adict(dict([('file%d' % i, i) for i in range(10)]), 'natural')
+        x.enable_stats()
+        self.assertEqual(x.index('file3'), 3)
+        self.assertEqual(x.stats()['rebuilds'], 1)
+        self.assertEqual(x.stats()['cmp_calls'], 0)
+        self.assertEqual([k for k in x.irange('file2', 'file4')],
+                         ['file2', 'file3'])
+        self.assertEqual(x.stats()['cmp_calls'], 2)
+
+
+class CollationSuite(unittest.TestCase):
+    def test_natural(self):
+        """Test natural ordering, where runs of digits are compared
+        by value.
+        """
+        x = adict(dict.fromkeys(['file10', 'File2', 'file1', 'a']), 'natural')
+        self.assertEqual([k for k in x], ['a', 'file1', 'File2', 'file10'])
+        x['file3'] = None
+        self.assertEqual(x.index('file3'), 3)
+        self.assertEqual([k for k in x.irange('file2', 'file4')],
+                         ['File2', 'file3'])
+
+    def test_casefold(self):
+        """Test casefolded ordering."""
+        x = adict({ 'b': 1, 'A': 2, 'c': 3 }, 'casefold')
+        self.assertEqual([k for k in x], ['A', 'b', 'c'])
+
+    def test_custom(self):
+        """Test that a custom collation function is only called once
+        per key, however many times the dictionary is re-sorted.
+        """
+        calls = []
+
+        def collate(key):
+            calls.append(key)
+            return -len(key)
+        x = adict({ 'a': 1, 'bbb': 2 }, collate)
+        x['cc'] = 3
+        self.assertEqual([k for k in x], ['bbb', 'cc', 'a'])
+        x['dddd'] = 4
+        del x['cc']
+        self.assertEqual([k for k in x], ['dddd', 'bbb', 'a'])
+        self.assertEqual(sorted(calls), ['a', 'bbb', 'cc', 'dddd'])
+
+    def test_interned(self):
+        """Test that collation keys are shared between dictionaries."""
+        x = adict({ 'file10': 1 }, 'natural')
+        y = adict({ 'file10': 2 }, 'natural')
+        self.assertIs(x._sort_key_cache['file10'],
+                      y._sort_key_cache['file10'])
+
+    def test_shared(self):
+        """Test that dictionaries using the same function share one
+        collation, even once unpickled, and so can be ordered against
+        one another.
+        """
+        x = adict({ 'a': 1 }, len)
+        y = adict({ 'bb': 1 }, len)
+        self.assertIs(x._cmp, y._cmp)
+        self.assertTrue(x < y)
+        z = pickle.loads(pickle.dumps(adict({ 'file2': 1 }, 'natural')))
+        self.assertIs(z._cmp, adict({}, 'natural')._cmp)
+        self.assertTrue(z < adict({ 'file10': 1 }, 'natural'))
+
+    def test_shared_released(self):
+        """Test that a custom collation is forgotten once no dictionary
+        is using it.
+        """
+        count = len(collation._wrapped)
+        x = adict({ 'a': 1 }, lambda k: k.lower())
+        self.assertEqual(len(collation._wrapped), count + 1)
+        del x
+        gc.collect()
+        self.assertEqual(len(collation._wrapped), count)
+
+    def test_locale_not_interned(self):
+        """Test that locale collation keys are not shared, since they
+        depend on the current locale.
+        """
+        x = adict({ 'a': 1 }, 'locale')
+        self.assertEqual([k for k in x], ['a'])
+        self.assertEqual(x._cmp._interned, {})
+
+    def test_unknown(self):
+        """Test that an unknown collation is an error."""
+        with self.assertRaises(ValueError):
+            adict({}, 'bogus')
+
+    def test_copy(self):
+        """Test that copies keep the collation."""
+        x = adict({ 'file10': 1, 'file9': 2 }, 'natural')
+        for y in (copy(x), deepcopy(x), pickle.loads(pickle.dumps(x))):
+            self.assertEqual([k for k in y], ['file9', 'file10'])
+            y['file1'] = 3
+            self.assertEqual([k for k in y], ['file1', 'file9', 'file10'])
+        self.assertEqual([k for k in x.freeze()], ['file9', 'file10'])
+        self.assertIsNone(copy(adict(a=1))._sort_key_cache)
+
+
+class WindowedSuite(unittest.TestCase):
+    def setUp(self):
+        self.expired = []
+        self.x = WindowedSortedDict(lambda k: k, 10,
+                                    [(i, i * 2) for i in range(5)],
+                                    on_expire=self.expired.extend)
+
+    def test_expire_on_insert(self):
+        """Test that old keys are dropped as new ones arrive."""
+        self.x[12] = 24
+        self.assertEqual([k for k in self.x], [2, 3, 4, 12])
+        self.assertEqual(self.expired, [(0, 0), (1, 2)])
+        self.x[3] = 'changed'
+        self.x[14] = 28
+        self.assertEqual([i for i in self.x.items()],
+                         [(4, 8), (12, 24), (14, 28)])
+        self.assertEqual(len(self.x), 3)
+
+    def test_insert_in_place(self):
+        """Test that new keys are added to the key order without it being
+        thrown away and sorted again.
+        """
+        self.x.enable_stats()
+        self.x[3.5] = 7
+        self.x[-7] = 'too old'
+        self.x.setdefault(2.5, 5)
+        self.assertEqual([k for k in self.x], [0, 1, 2, 2.5, 3, 3.5, 4])
+        self.assertEqual(self.x.index(3.5), 5)
+        self.assertEqual(self.x.stats()['rebuilds'], 0)
+        self.assertEqual(self.expired, [(-7, 'too old')])
+
+    def test_expire_on_demand(self):
+        """Test expiring keys relative to a given point."""
+        x = WindowedSortedDict(lambda k: k, 10, expire_on_insert=False)
+        x.update([(i, i) for i in range(20)])
+        self.assertEqual(len(x), 20)
+        self.assertEqual(x.expire(), [(i, i) for i in range(9)])
+        self.assertEqual(x.expire(25), [(9, 9), (10, 10), (11, 11),
+                                        (12, 12), (13, 13), (14, 14)])
+        self.assertEqual([k for k in x], list(range(15, 20)))
+        self.assertEqual(x.expire(100), [(i, i) for i in range(15, 20)])
+        self.assertEqual(x.expire(), [])
+        self.assertEqual(len(x), 0)
+
+    def test_copy(self):
+        """Test that copies keep the window."""
+        y = copy(self.x)
+        y[20] = 40
+        self.assertEqual([k for k in y], [20])
+        self.assertEqual([k for k in deepcopy(self.x)], list(range(5)))
+
+    def test_pickle(self):
+        """Test pickling, ensuring that keys outside the window are kept
+        if expiry is only done on demand.
+        """
+        x = WindowedSortedDict(abs, 10, { 1: 'a', 5: 'b' })
+        y = pickle.loads(pickle.dumps(x))
+        self.assertEqual(x, y)
+        self.assertEqual(y.horizon, 10)
+        y[14] = 'c'
+        self.assertEqual([k for k in y], [5, 14])
+        x = WindowedSortedDict(abs, 10, expire_on_insert=False)
+        x.update({ 1: 'a', 50: 'b' })
+        y = pickle.loads(pickle.dumps(x))
+        self.assertEqual([k for k in y], [1, 50])
+        self.assertEqual(y.expire(), [(1, 'a')])
+
+
+class FrozenSuite(unittest.TestCase):
+    def test_init(self):
+        """Test initialization of frozen sorted dictionaries."""
+        x = fadict({ 'z': 5, 1: 'one' }, a='x')
+        self.assertEqual([k for k in x.keys()], ['1', 'a', 'z'])
+        y = fsdict(lambda k: -k, { 1: 'a', 2: 'b' })
+        self.assertEqual([k for k in y.keys()], [2, 1])
+        z = fadict({ 'file10': 1, 'file9': 2 }, 'natural')
+        self.assertEqual([k for k in z.keys()], ['file9', 'file10'])
+        self.assertNotEqual(z, fadict({ 'file10': 1, 'file9': 2 }))
+        self.assertEqual([k for k in fadict((i, i) for i in (2, 10, 1))],
+                         ['1', '10', '2'])
+
+    def test_immutable(self):
+        """Test that every mutating method is refused."""
+        x = fadict(a=1)
+        with self.assertRaises(TypeError):
+            x['b'] = 2
+        with self.assertRaises(TypeError):
+            del x['a']
+        for method in ('clear', 'pop', 'popitem', 'setdefault', 'update'):
+            with self.assertRaises(TypeError):
+                getattr(x, method)('a')
+        with self.assertRaises(TypeError):
+            x |= { 'b': 2 }
+        self.assertEqual(x, { 'a': 1 })
+
+    def test_hash(self):
+        """Test that frozen dictionaries can be used as dictionary keys
+        and set members.
+        """
+        x = fadict(a=1, b=2)
+        y = adict(b=2, a=1).freeze()
+        self.assertEqual(hash(x), hash(y))
+        self.assertEqual(len(set([x, y])), 1)
+        self.assertEqual({ x: 'found' }[y], 'found')
+
+    def test_equality(self):
+        """Test that frozen dictionaries are equal if and only if they
+        hold the same items in the same order.
+        """
+        x = fsdict(lambda k: k, { 1: 'a', 2: 'b' })
+        self.assertEqual(x, fsdict(lambda k: k, { 1: 'a', 2: 'b' }))
+        self.assertNotEqual(x, fsdict(lambda k: -k, { 1: 'a', 2: 'b' }))
+        self.assertNotEqual(x, fsdict(lambda k: k, { 1: 'a', 2: 'c' }))
+        self.assertNotEqual(x, fsdict(lambda k: k, { 1: 'a' }))
+        self.assertEqual(x, { 1: 'a', 2: 'b' })
+
+    def test_freeze(self):
+        """Test that freezing reuses the existing key order."""
+        x = adict(b=1, A=2, c=3)
+        order = x._key_order()
+        y = x.freeze()
+        self.assertIsInstance(y, fadict)
+        self.assertEqual(y._key_order_cache, tuple(order))
+        self.assertIs(y.freeze(), y)
+        x['a'] = 4
+        self.assertEqual([k for k in y], ['A', 'b', 'c'])
+        self.assertIsInstance(sdict(len, { 'a': 1 }).freeze(), fsdict)
+
+    def test_copy(self):
+        """Test copying of frozen dictionaries."""
+        x = fadict(a=[1], b=2)
+        self.assertIs(copy(x), x)
+        y = deepcopy(x)
+        self.assertEqual(x, y)
+        self.assertIsNot(x['a'], y['a'])
+        self.assertEqual([k for k in y], ['a', 'b'])
+
+    def test_pickle(self):
+        """Test pickling of frozen dictionaries."""
+        x = fadict(b=1, a=2)
+        y = pickle.loads(pickle.dumps(x))
+        self.assertEqual(x, y)
+        self.assertEqual(hash(x), hash(y))
+
+
+class ShardedSuite(unittest.TestCase):
+    def setUp(self):
+        self.data = dict([(i, six.text_type(i)) for i in range(100)])
+
+    def test_init_dict(self):
+        """Test that a bulk load spreads keys across shards, and that
+        they come back in order.
+        """
+        x = ShardedSortedDict(lambda k: k, self.data, shard_count=4)
+        self.assertEqual(len(x._shards), 4)
+        self.assertEqual(len(x), 100)
+        self.assertEqual([k for k in x.keys()], list(range(100)))
+        self.assertEqual(x[42], '42')
+
+    def test_init_mapping(self):
+        """Test bulk loading from other mappings, including sorted
+        ones, without sorting them first.
+        """
+        source = sdict(lambda k: k, self.data)
+        source.enable_stats()
+        x = ShardedSortedDict(lambda k: k, source, shard_count=4)
+        self.assertEqual(source.stats()['rebuilds'], 0)
+        y = ShardedSortedDict(lambda k: k, x, shard_count=2)
+        self.assertEqual([i for i in y.items()], [i for i in x.items()])
+
+    def test_load_executor(self):
+        """Test bulk loading shards in parallel from a thread pool."""
+        try:
+            from concurrent.futures import ThreadPoolExecutor
+        except ImportError:
+            self.skipTest('concurrent.futures is not available.')
+        x = ShardedSortedDict(lambda k: -k, shard_count=8)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            x.load(self.data, executor=executor)
+        self.assertEqual([k for k in x], list(range(99, -1, -1)))
+
+    def test_split(self):
+        """Test that shards split once they grow too large."""
+        x = ShardedSortedDict(lambda k: k, max_shard_size=10)
+        for i in reversed(range(50)):
+            x[i] = i
+        self.assertTrue(len(x._shards) >= 5)
+        self.assertTrue(all([len(s) <= 10 for s in x._shards]))
+        self.assertEqual([k for k in x], list(range(50)))
+
+    def test_split_equal_keys(self):
+        """Test that keys which compare equal are never split across
+        shards.
+        """
+        x = ShardedSortedDict(six.text_type.lower, max_shard_size=2)
+        for key in ('a', 'A', 'b', 'B', 'c'):
+            x[key] = key
+        self.assertEqual(sorted([len(s) for s in x._shards]), [1, 2, 2])
+        for key in ('a', 'A', 'b', 'B', 'c'):
+            self.assertEqual(x[key], key)
+
+    def test_split_unsplittable(self):
+        """Test that a shard whose keys all compare equal is not sorted
+        again on every write in an attempt to split it.
+        """
+        x = ShardedSortedDict(lambda k: k // 1000, max_shard_size=10)
+        for i in range(100):
+            x[i] = i
+        shard = x._shards[0]
+        self.assertEqual(len(x._shards), 1)
+        shard.enable_stats()
+        for i in range(100, 200):
+            x[i] = i
+        self.assertTrue(shard.stats()['rebuilds'] <= 1)
+        self.assertEqual([k for k in x], list(range(200)))
+        x[5000] = 5000
+        self.assertEqual(x[5000], 5000)
+
+    def test_delitem_merge(self):
+        """Test that emptied shards are merged away."""
+        x = ShardedSortedDict(lambda k: k, self.data, shard_count=4)
+        for i in range(25, 75):
+            del x[i]
+        self.assertEqual(len(x._shards), 2)
+        self.assertEqual(x.pop(10), '10')
+        self.assertEqual(x.pop(10, None), None)
+        with self.assertRaises(KeyError):
+            x[10]
+        self.assertEqual(len(x), 49)
+
+    def test_index(self):
+        """Test the index method."""
+        x = ShardedSortedDict(lambda k: k, self.data, shard_count=4)
+        self.assertEqual(x.index(0), 0)
+        self.assertEqual(x.index(73), 73)
+        with self.assertRaises(ValueError):
+            x.index(200)
+
+    def test_irange(self):
+        """Test range queries spanning several shards."""
+        x = ShardedSortedDict(lambda k: k, self.data, shard_count=4)
+        self.assertEqual([k for k in x.irange(20, 80, descending=True)],
+                         list(range(79, 19, -1)))
+        self.assertEqual([k for k in reversed(x)], list(range(99, -1, -1)))
+        self.assertEqual([v for v in x.reversed_values()][0], '99')
+        self.assertEqual([k for k in x.irange(20, 80)], list(range(20, 80)))
+        self.assertEqual([k for k in x.irange(stop=3)], [0, 1, 2])
+        self.assertEqual([k for k in x.irange(97)], [97, 98, 99])
+
+    def test_rebalance(self):
+        """Test redistributing keys evenly across shards."""
+        x = ShardedSortedDict(lambda k: k, max_shard_size=1000)
+        x.update(self.data)
+        self.assertEqual(len(x._shards), 1)
+        x.rebalance(5)
+        self.assertEqual([len(s) for s in x._shards], [20] * 5)
+        self.assertEqual([v for v in x.values()][:3], ['0', '1', '2'])
+
+    def test_clear(self):
+        """Test clearing, ensuring that it acts as we expect."""
+        x = ShardedSortedDict(lambda k: k, self.data, shard_count=4)
+        x.clear()
+        self.assertEqual(len(x), 0)
+        self.assertEqual([k for k in x], [])
+        x[1] = 'a'
+        self.assertEqual([i for i in x.items()], [(1, 'a')])
+
+    def test_copy(self):
+        """Test that copies get shards and locks of their own."""
+        x = ShardedSortedDict(lambda k: k, { 1: [1], 50: [50] },
+                              shard_count=2)
+        y = copy(x)
+        y[2] = [2]
+        self.assertEqual([k for k in x], [1, 50])
+        self.assertEqual([k for k in y], [1, 2, 50])
+        self.assertIs(y[1], x[1])
+        self.assertIsNot(y._shards[0].lock, x._shards[0].lock)
+        z = deepcopy(x)
+        del z[1]
+        self.assertEqual([i for i in z.items()], [(50, [50])])
+        self.assertIsNot(z[50], x[50])
+        self.assertEqual(len(x), 2)
+
+
+class SharedSuite(unittest.TestCase):
+    def setUp(self):
+        if shared.shared_memory is None:
+            self.skipTest('Shared memory is not available.')
+        source = adict({ 'z': 5, 'y': 2.5, 'a': 'x', 'B': b'bytes',
+                         'c': None, 'd': True, 'e': 2 ** 80 })
+        self.x = SharedSortedDict.create(source)
+        self.addCleanup(self.x.unlink)
+        self.addCleanup(self.x.close)
+
+    def test_attach(self):
+        """Test attaching to a segment by name, and reading back every
+        supported type.
+        """
+        with SharedSortedDict(six.text_type.lower, self.x.name) as y:
+            self.assertEqual([k for k in y],
+                             ['a', 'B', 'c', 'd', 'e', 'y', 'z'])
+            self.assertEqual([v for v in y.values()],
+                             ['x', b'bytes', None, True, 2 ** 80, 2.5, 5])
+            self.assertEqual(dict(y.items()), dict(self.x.items()))
+
+    def test_attach_child_process(self):
+        """Test that a separate process can attach and exit without
+        destroying the segment.
+        """
+        script = '; '.join([
+            'import six, sys',
+            'from sdict import SharedSortedDict',
+            'y = SharedSortedDict(six.text_type.lower, sys.argv[1])',
+            'sys.stdout.write(y["a"])',
+            'y.close()',
+        ])
+        output = subprocess.check_output(
+            [sys.executable, '-c', script, self.x.name],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        self.assertEqual(output, b'x')
+        with SharedSortedDict(six.text_type.lower, self.x.name) as y:
+            self.assertEqual(y['z'], 5)
+
+    def test_attach_spawn_pool(self):
+        """Test that workers started by `spawn`, which share the resource
+        tracker of the process that created the segment, leave it
+        registered there.
+        """
+        script = '\n'.join([
+            'import multiprocessing, six',
+            'from sdict import adict, SharedSortedDict',
+            '',
+            'def read(name):',
+            '    with SharedSortedDict(six.text_type.lower, name) as y:',
+            '        return y["a"]',
+            '',
+            'if __name__ == "__main__":',
+            '    x = SharedSortedDict.create(adict(a="x"))',
+            '    pool = multiprocessing.get_context("spawn").Pool(2)',
+            '    print(pool.map(read, [x.name] * 4))',
+            '    pool.close()',
+            '    pool.join()',
+            '    x.close()',
+            '    x.unlink()',
+        ])
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'pool.py')
+        with open(path, 'w') as f:
+            f.write(script)
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.path.dirname(os.path.abspath(__file__))
+        process = subprocess.Popen(
+            [sys.executable, path],
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        output, errors = process.communicate()
+        self.assertEqual(output.strip(), b"['x', 'x', 'x', 'x']")
+        self.assertEqual(errors, b'')
+
+    def test_attach_invalid(self):
+        """Test that attaching to something else is an error."""
+        other = shared.shared_memory.SharedMemory(create=True, size=32)
+        self.addCleanup(other.unlink)
+        self.addCleanup(other.close)
+        with self.assertRaises(ValueError):
+            SharedSortedDict(six.text_type.lower, other.name)
+
+    def test_getitem(self):
+        """Test item retrieval by binary search."""
+        self.assertEqual(self.x['B'], b'bytes')
+        self.assertEqual(self.x.get('z'), 5)
+        self.assertEqual(self.x.get('b', None), None)
+        self.assertTrue('a' in self.x)
+        self.assertFalse('A' in self.x)
+        with self.assertRaises(KeyError):
+            self.x['w']
+
+    def test_index(self):
+        """Test the index method."""
+        self.assertEqual(self.x.index('a'), 0)
+        self.assertEqual(self.x.index('y'), 5)
+        with self.assertRaises(ValueError):
+            self.x.index('w')
+
+    def test_irange(self):
+        """Test iterating over a range of keys."""
+        self.assertEqual([k for k in self.x.irange('b', 'e')], ['B', 'c', 'd'])
+        self.assertEqual([k for k in self.x.irange('x')], ['y', 'z'])
+        self.assertEqual([k for k in self.x.irange('x', descending=True)],
+                         ['z', 'y'])
+        self.assertEqual([k for k in reversed(self.x)][:2], ['z', 'y'])
+        self.assertEqual([i for i in self.x.reversed_items()][0], ('z', 5))
+
+    def test_unsupported_type(self):
+        """Test that values which cannot be stored are rejected."""
+        with self.assertRaises(TypeError):
+            SharedSortedDict.create(adict(a=object()))
+
+
 class SupportSuite(unittest.TestCase):
     def test_no_default(self):
         """Establish that my NoDefault special object is falsy